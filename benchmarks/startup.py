@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Measure cold start-up latency of the lambkin CLI, per subcommand.
+
+Each command is run in a fresh interpreter, so the numbers include every
+import the command triggers. Results are printed as JSON, in seconds.
+
+    python benchmarks/startup.py --runs 20
+"""
+from __future__ import absolute_import
+
+import click
+import json
+import os
+import sys
+import time
+from subprocess import check_call
+
+COMMANDS = [
+    ['--version'],
+    ['create', '--help'],
+    ['build', '--help'],
+    ['dev', '--help'],
+    ['invoke-local', '--help'],
+    ['keep-warm', '--help'],
+    ['list-published', '--help'],
+    ['package', '--help'],
+    ['publish', '--help'],
+    ['run', '--help'],
+    ['schedule', '--help'],
+    ['tune', '--help'],
+    ['unpublish', '--help'],
+]
+
+
+def time_command(args, runs):
+    timings = []
+    with open(os.devnull, 'w') as null:
+        for _ in range(runs):
+            start = time.time()
+            check_call([sys.executable, '-m', 'lambkin.lambkin'] + args,
+                       stdout=null, stderr=null)
+            timings.append(time.time() - start)
+    timings.sort()
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'max': timings[-1],
+    }
+
+
+@click.command()
+@click.option('--runs', default=10, type=click.IntRange(min=1),
+              help='Number of times to run each command.')
+def main(runs):
+    results = {}
+    for args in COMMANDS:
+        results[' '.join(args)] = time_command(args, runs)
+    print json.dumps(results, sort_keys=True, indent=2)
+
+
+if __name__ == '__main__':
+    main()
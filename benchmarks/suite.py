@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+"""Time lambkin's hot paths against synthetic functions and mocked AWS.
+
+Function trees are generated with a given number of files and a given
+volume of dependencies, then used to time:
+
+    zip.cold        create_zip() with no zip cache
+    zip.warm        create_zip() with every file already in the zip cache
+    metadata.read   parsing metadata.json from disk
+    metadata.update one batched update of metadata.json
+    publish.create  "lambkin publish" of a brand new function
+    publish.update  "lambkin publish" after the function's code changed
+    run             "lambkin run" of the published function
+
+AWS is replaced by moto (pip install "moto<2"), so nothing leaves the
+machine. Lambda invocations return a canned response, rather than
+running the function in docker.
+
+Results are printed as JSON, in seconds. Save them with --output, and
+compare a later run against them with --baseline to catch regressions:
+
+    python benchmarks/suite.py --tree small --output baseline.json
+    python benchmarks/suite.py --tree small --baseline baseline.json
+"""
+from __future__ import absolute_import
+
+import base64
+import click
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Name: (number of files, bytes of dependencies)
+TREES = {
+    'tiny': (10, 64 * 1024),
+    'small': (1000, 10 * 1024 * 1024),
+    'medium': (10000, 50 * 1024 * 1024),
+    'large': (50000, 300 * 1024 * 1024),
+}
+
+BENCHMARKS = ['zip.cold', 'zip.warm', 'metadata.read', 'metadata.update',
+              'publish.create', 'publish.update', 'run']
+
+# Stand in for Lambda's log tail, so that "run" has a report to parse.
+INVOKE_LOG = '\n'.join([
+    'START RequestId: 00000000-0000-0000-0000-000000000000 Version: $LATEST',
+    'END RequestId: 00000000-0000-0000-0000-000000000000',
+    'REPORT RequestId: 00000000-0000-0000-0000-000000000000\t'
+    'Duration: 1.00 ms\tBilled Duration: 100 ms\tMemory Size: 128 MB\t'
+    'Max Memory Used: 20 MB\t',
+])
+
+HANDLER = '''def handler(event, context):
+    return {"hello": "World"}
+'''
+
+
+def make_source(rng, size):
+    """Return size bytes of something that compresses about like code."""
+    words = ['def', 'return', 'self', 'import', 'if', 'else', 'for', 'in',
+             'None', 'True', '(', ')', ':', '=', '\n    ', '\n']
+    chunks = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.2:
+            chunk = '%x' % rng.getrandbits(64)
+        else:
+            chunk = rng.choice(words)
+        chunks.append(chunk + ' ')
+        length += len(chunk) + 1
+    return ''.join(chunks)[:size]
+
+
+def write_function_files(function_dir, name):
+    """Write a function's handler and metadata.json."""
+    with open(os.path.join(function_dir, '%s.py' % name), 'w') as f:
+        f.write(HANDLER)
+    with open(os.path.join(function_dir, 'metadata.json'), 'w') as f:
+        json.dump({'function': name, 'runtime': 'python2.7',
+                   'description': 'Lambkin benchmark function'}, f)
+
+
+def make_function_tree(root, name, files, dependency_bytes):
+    """Generate a Python function with files files in all.
+
+    Besides its handler and metadata, the function gets a virtualenv with
+    dependency_bytes of modules, spread across packages of 100 files each.
+
+    A tree that is already in root is reused, but its handler and metadata
+    are written afresh, since some benchmarks change them.
+    """
+    function_dir = os.path.join(root, name)
+    marker = os.path.join(function_dir, '.benchmark-tree')
+    spec = '%d %d' % (files, dependency_bytes)
+    try:
+        with open(marker) as f:
+            if f.read() == spec:
+                write_function_files(function_dir, name)
+                return function_dir
+    except IOError:
+        pass
+
+    shutil.rmtree(function_dir, ignore_errors=True)
+    site_dir = os.path.join(function_dir, 'venv', 'lib', 'python2.7',
+                            'site-packages')
+    os.makedirs(site_dir)
+    write_function_files(function_dir, name)
+
+    rng = random.Random(files)
+    modules = max(files - 2, 1)
+    module_size = dependency_bytes // modules
+    for i in range(modules):
+        package_dir = os.path.join(site_dir, 'package%04d' % (i // 100))
+        if i % 100 == 0:
+            os.mkdir(package_dir)
+        with open(os.path.join(package_dir, 'module%02d.py' % (i % 100)),
+                  'w') as f:
+            f.write(make_source(rng, module_size))
+
+    with open(marker, 'w') as f:
+        f.write(spec)
+    return function_dir
+
+
+def fake_invoke(self, body, request_headers, response_headers):
+    """Answer an invocation like Lambda would, without running anything."""
+    response_headers['x-amz-log-result'] = base64.b64encode(INVOKE_LOG)
+    return json.dumps({'hello': 'World'})
+
+
+def make_configuration_handler(put_configuration):
+    """Add GetFunctionConfiguration, which moto lacks, to its Lambda."""
+    def configuration(request, full_url, headers):
+        if request.method != 'GET':
+            return put_configuration(request, full_url, headers)
+        response = put_configuration.__self__
+        response.setup_class(request, full_url, headers)
+        function_name = response.path.rstrip('/').split('/')[-2]
+        fn = response.lambda_backend.get_function(function_name, None)
+        if not fn:
+            return 404, {'x-amzn-ErrorType': 'ResourceNotFoundException'}, '{}'
+        # moto applies every change at once, so it's always done.
+        configuration = dict(fn.get_configuration(), State='Active',
+                             LastUpdateStatus='Successful')
+        return 200, {}, json.dumps(configuration)
+    return configuration
+
+
+@contextmanager
+def mock_aws():
+    """Replace Lambda, IAM, STS, Events and S3 with moto's in-memory mocks."""
+    try:
+        import docker
+        import moto
+        from moto.awslambda.models import LambdaFunction
+        from moto.awslambda.urls import url_paths
+    except ImportError:
+        raise click.ClickException('The benchmarks need moto. '
+                                   'pip install "moto<2"')
+    for path, handler in url_paths.items():
+        if path.endswith('/configuration/?$'):
+            url_paths[path] = make_configuration_handler(handler)
+    mocks = [moto.mock_lambda(), moto.mock_iam(), moto.mock_sts(),
+             moto.mock_events(), moto.mock_s3()]
+    for mock in mocks:
+        mock.start()
+    original_invoke = LambdaFunction.invoke
+    LambdaFunction.invoke = fake_invoke
+    # moto makes a docker client for every function. Pinning the API
+    # version stops it from asking a docker daemon, which needn't exist.
+    original_from_env = docker.from_env
+    docker.from_env = lambda: original_from_env(version='1.35')
+    try:
+        from lambkin.aws import get_client
+        get_client('iam').create_role(
+            RoleName='lambda_basic_execution',
+            AssumeRolePolicyDocument=json.dumps({'Version': '2012-10-17'}))
+        yield
+    finally:
+        LambdaFunction.invoke = original_invoke
+        docker.from_env = original_from_env
+        for mock in reversed(mocks):
+            mock.stop()
+
+
+def invoke_command(command, args):
+    from click.testing import CliRunner
+    result = CliRunner().invoke(command, args, catch_exceptions=False)
+    if result.exit_code != 0:
+        raise click.ClickException('%s failed:\n%s' % (command.name,
+                                                       result.output))
+
+
+def touch_handler():
+    """Change the function's code, so that the next publish uploads it."""
+    name = os.path.basename(os.getcwd())
+    with open('%s.py' % name, 'a') as f:
+        f.write('# %f\n' % time.time())
+
+
+def time_benchmark(benchmark, runs, zip_path):
+    """Run one benchmark runs times, in the current function's directory."""
+    import lambkin.lambkin as cli
+    import lambkin.metadata as metadata
+    from lambkin.zip import create_zip
+
+    name = os.path.basename(os.getcwd())
+    setup = None
+    if benchmark == 'zip.cold':
+        def measured():
+            create_zip(zip_path, use_cache=False)
+    elif benchmark == 'zip.warm':
+        create_zip(zip_path)
+
+        def measured():
+            create_zip(zip_path)
+    elif benchmark == 'metadata.read':
+        setup = metadata._cache.clear
+
+        def measured():
+            metadata.read()
+    elif benchmark == 'metadata.update':
+        def measured():
+            with metadata.batched_updates():
+                metadata.update(timeout=60, memory=128)
+                metadata.update(description=str(time.time()))
+    elif benchmark == 'publish.create':
+        def setup():
+            from lambkin.aws import get_client
+            try:
+                get_client('lambda').delete_function(FunctionName=name)
+            except Exception:
+                pass
+
+        def measured():
+            invoke_command(cli.publish, ['--zip-file-path', zip_path])
+    elif benchmark == 'publish.update':
+        invoke_command(cli.publish, ['--zip-file-path', zip_path])
+        setup = touch_handler
+
+        def measured():
+            invoke_command(cli.publish, ['--zip-file-path', zip_path])
+    elif benchmark == 'run':
+        invoke_command(cli.publish, ['--zip-file-path', zip_path])
+
+        def measured():
+            invoke_command(cli.run, [])
+
+    timings = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.time()
+        measured()
+        timings.append(time.time() - start)
+    timings.sort()
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'max': timings[-1],
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for each median that is slower than the baseline."""
+    regressions = []
+    for tree, benchmarks in sorted(results.iteritems()):
+        for benchmark, timing in sorted(benchmarks.iteritems()):
+            try:
+                before = baseline['results'][tree][benchmark]['median']
+            except KeyError:
+                continue
+            if timing['median'] > before * (1 + tolerance):
+                regressions.append('%s %s: %.4fs, was %.4fs' % (
+                    tree, benchmark, timing['median'], before))
+    return regressions
+
+
+@click.command()
+@click.option('--tree', 'trees', type=click.Choice(sorted(TREES)),
+              multiple=True, help='A function size to try. Repeat to try several. Default: tiny and small.')
+@click.option('--benchmark', 'benchmarks', type=click.Choice(BENCHMARKS),
+              multiple=True, help='A benchmark to run. Repeat to run several. Default: all of them.')
+@click.option('--runs', default=5, type=click.IntRange(min=1),
+              help='Number of times to run each benchmark.')
+@click.option('--work-dir', type=click.Path(file_okay=False),
+              help='Keep generated functions here, to reuse them next time.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Also write the results to this file.')
+@click.option('--baseline', type=click.File(),
+              help='Results from an earlier run. Exit with an error if anything got slower.')
+@click.option('--tolerance', default=0.2, type=float,
+              help='How much slower than the baseline is acceptable. Default: 0.2 (20%).')
+def main(trees, benchmarks, runs, work_dir, output, baseline, tolerance):
+    trees = trees or ['tiny', 'small']
+    benchmarks = benchmarks or BENCHMARKS
+    scratch_dir = tempfile.mkdtemp(prefix='lambkin-benchmark-')
+    # Keep the benchmarks from reading, or filling, the real caches.
+    os.environ['LAMBKIN_CACHE_DIR'] = os.path.join(scratch_dir, 'cache')
+    os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
+    work_dir = os.path.abspath(work_dir or scratch_dir)
+    zip_path = os.path.join(scratch_dir, 'package.zip')
+    original_dir = os.getcwd()
+
+    results = {}
+    try:
+        with mock_aws():
+            for tree in trees:
+                files, dependency_bytes = TREES[tree]
+                function_dir = make_function_tree(
+                    work_dir, 'benchmark-%s' % tree, files, dependency_bytes)
+                os.chdir(function_dir)
+                results[tree] = {}
+                for benchmark in benchmarks:
+                    click.echo('%s %s' % (tree, benchmark), err=True)
+                    results[tree][benchmark] = time_benchmark(
+                        benchmark, runs, zip_path)
+                os.chdir(original_dir)
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'results': results,
+    }
+    print json.dumps(report, sort_keys=True, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, sort_keys=True, indent=2)
+
+    if baseline:
+        regressions = compare(results, json.load(baseline), tolerance)
+        for regression in regressions:
+            click.echo('Slower: %s' % regression, err=True)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,139 @@
-import boto3
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from lambkin.cache import get_cache_dir
+from lambkin.instrument import span
+
+# How long, in seconds, to trust identity lookups cached on disk.
+# Set LAMBKIN_IDENTITY_TTL=0 to disable the disk cache.
+IDENTITY_TTL = int(os.environ.get('LAMBKIN_IDENTITY_TTL', 3600))
+
+# Botocore backs off exponentially when it retries throttled calls, so
+# give it plenty of attempts when many calls are made at once. eg.
+#
+# get_client('lambda', retries={'max_attempts': THROTTLED_MAX_ATTEMPTS})
+THROTTLED_MAX_ATTEMPTS = 10
+
+_session = None
+_clients = {}
+_clients_lock = threading.Lock()
+_resolved = {}
+
+
+def get_session():
+    """Return the boto3 session shared by the whole process.
+
+    boto3 is imported here, rather than at the top of the module, so that
+    commands which never talk to AWS don't pay for importing it.
+    """
+    global _session
+    if _session is None:
+        import boto3
+        _session = boto3.session.Session()
+    return _session
+
+
+def get_client(service, region_name=None, endpoint_url=None, **config):
+    """Return a shared boto3 client, creating it on first use.
+
+    Clients are cached per service, region, endpoint and any botocore
+    Config options given as keyword arguments. eg.
+
+    get_client('lambda', retries={'max_attempts': 1})
+    """
+    region_name = region_name or get_region()
+    key = (service, region_name, endpoint_url,
+           json.dumps(config, sort_keys=True))
+    with _clients_lock:
+        if key not in _clients:
+            from botocore.config import Config
+            _clients[key] = get_session().client(
+                service, region_name=region_name, endpoint_url=endpoint_url,
+                config=Config(**config) if config else None)
+        return _clients[key]
 
 
 def get_region():
     """Return the configured AWS region, or "us-east-1" if undefined."""
-    return boto3.session.Session().region_name or 'us-east-1'
+    return get_session().region_name or 'us-east-1'
+
+
+def get_credentials_scope(*extra):
+    """Return a short key identifying the credentials in use.
+
+    It is built from the access key that botocore resolves, wherever that
+    came from (the environment, a profile, SSO or an instance role), so
+    switching accounts always switches scope. Resolving credentials costs
+    no AWS API calls. Useful for keeping cached lookups for different
+    accounts apart.
+    """
+    credentials = get_session().get_credentials()
+    scope = ':'.join([
+        get_session().profile_name or '',
+        credentials.access_key if credentials else '',
+    ] + list(extra))
+    return hashlib.sha1(scope).hexdigest()
+
+
+def _get_identity_cache_path():
+    return os.path.join(get_cache_dir('identity'),
+                        '%s.json' % get_credentials_scope())
+
+
+def _read_identity_cache():
+    try:
+        with open(_get_identity_cache_path()) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write_identity_cache(cache):
+    path = _get_identity_cache_path()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(cache, f)
+    os.rename(tmp_path, path)
+
+
+def resolve(key, lookup):
+    """Return a memoized identity value, calling lookup() to find it.
+
+    Values are kept for the life of the process and, unless IDENTITY_TTL
+    is zero, on disk for IDENTITY_TTL seconds.
+    """
+    if key in _resolved:
+        return _resolved[key]
+
+    if IDENTITY_TTL > 0:
+        cache = _read_identity_cache()
+        entry = cache.get(key)
+        if entry and time.time() - entry['time'] < IDENTITY_TTL:
+            _resolved[key] = entry['value']
+            return entry['value']
+
+    with span('aws.resolve', key=key):
+        value = lookup()
+    _resolved[key] = value
+    if IDENTITY_TTL > 0:
+        cache[key] = {'value': value, 'time': time.time()}
+        _write_identity_cache(cache)
+    return value
 
 
 def get_account_id():
-    """Get the AWS account id for our current credentials."""
-    return boto3.resource('iam').CurrentUser().arn.split(':')[4]
+    """Get the AWS account id for our current credentials.
+
+    STS works for IAM users and assumed roles alike.
+    """
+    def lookup():
+        return get_client('sts').get_caller_identity()['Account']
+    return resolve('account_id', lookup)
 
 
 def get_iam_arn_prefix():
@@ -27,8 +152,9 @@ def get_role_arn(role):
     get_role_arn('lambda_basic_execution')
     "arn:aws:iam::329487123:role/lambda-basic-execution"
     """
-    role = boto3.resource('iam').Role(role)
-    return role.arn
+    def lookup():
+        return get_client('iam').get_role(RoleName=role)['Role']['Arn']
+    return resolve('role:%s' % role, lookup)
 
 
 def get_event_rule_arn(rule):
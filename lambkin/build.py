@@ -0,0 +1,145 @@
+from __future__ import absolute_import
+
+import hashlib
+import os
+import sys
+import time
+from click import ClickException
+from lambkin.ignore import get_ignore_rules
+from lambkin.instrument import span
+from lambkin.pool import run_in_dir, run_in_pool
+from lambkin.runtime import get_language_name_for_runtime
+from lambkin.ux import say
+from lambkin.virtualenv import create_virtualenv, install_requirements
+from lambkin.virtualenv import get_dependency_fingerprint
+from lambkin.virtualenv import read_fingerprint, write_fingerprint
+from lambkin.zip import walk_tree
+from subprocess import Popen, PIPE, STDOUT
+import lambkin.metadata as metadata
+
+# Holds the fingerprint of a function's files after its last good make.
+build_fingerprint_file = '.lambkin-build'
+
+# Installed by make, so not part of what decides whether make should run.
+build_output_dirs = ('node_modules',)
+
+
+def build_function(force=False, wheel_cache=False, jobs=None, prefix=None):
+    """Build the function in the current dir.
+
+    Returns True if anything was (re)built.
+    """
+    runtime = metadata.get('runtime')
+    language = get_language_name_for_runtime(runtime)
+    if language == 'python':
+        # Use virtualenv and pip
+        if not os.path.isdir('venv'):
+            create_virtualenv('.')
+        fingerprint = get_dependency_fingerprint()
+        if not force and fingerprint == read_fingerprint():
+            say('Dependencies are up to date')
+            return False
+        print install_requirements(use_wheel_cache=wheel_cache)
+        write_fingerprint(fingerprint)
+        return True
+    else:
+        # Fall back to a Makefile.
+        return build_with_make(force, jobs, prefix)
+
+
+def get_build_fingerprint():
+    """Return a digest of the Makefile and everything else that make reads.
+
+    That's every file in the function's dir, except for ignored files and
+    the packages that make installs. Only the names of those packages
+    count, so that removing one means building again.
+    """
+    rules = get_ignore_rules(slim=metadata.get('slim'))
+    fingerprint = hashlib.sha256()
+    for path in sorted(walk_tree('.', rules,
+                                 skipped=('venv',) + build_output_dirs)):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        fingerprint.update('%s %s\n' % (path, digest.hexdigest()))
+    for output_dir in build_output_dirs:
+        if os.path.isdir(output_dir):
+            fingerprint.update('%s/ %s\n' % (
+                output_dir, ' '.join(sorted(os.listdir(output_dir)))))
+    return fingerprint.hexdigest()
+
+
+def read_build_fingerprint():
+    """Return the fingerprint of the last successful make, if any."""
+    try:
+        with open(build_fingerprint_file) as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def run_make(jobs=None, prefix=None):
+    """Run make, passing on each line of its output as it arrives.
+
+    Each line is stamped with the seconds since make started, and with
+    prefix, if there is one, to tell builds apart when several run at
+    once.
+    """
+    command = ['make']
+    if jobs:
+        command.append('-j%d' % jobs)
+    label = '%s ' % prefix if prefix else ''
+    start = time.time()
+    process = Popen(command, stdout=PIPE, stderr=STDOUT)
+    for line in iter(process.stdout.readline, b''):
+        say('[%s%5.1fs] %s' % (label, time.time() - start, line.rstrip('\n')))
+    if process.wait() != 0:
+        raise ClickException('make failure')
+
+
+def build_with_make(force=False, jobs=None, prefix=None):
+    """Run make, unless nothing has changed since it last succeeded.
+
+    The fingerprint is taken after make, so that files that make writes
+    into the function's dir don't count as changes next time.
+    """
+    if not force and get_build_fingerprint() == read_build_fingerprint():
+        say('%sBuild is up to date' % ('%s: ' % prefix if prefix else ''))
+        return False
+    with span('build.make', jobs=jobs):
+        run_make(jobs, prefix)
+    with open(build_fingerprint_file, 'w') as f:
+        f.write(get_build_fingerprint())
+    return True
+
+
+def build_here(result, force, wheel_cache, jobs):
+    result['function'] = metadata.get('function')
+    # Keep stdout clear for the summary. Build logs go to stderr.
+    sys.stdout = sys.stderr
+    rebuilt = build_function(force, wheel_cache, jobs,
+                             prefix=result['function'])
+    result['status'] = 'built' if rebuilt else 'unchanged'
+
+
+def build_in_dir(args):
+    """Build the function in a directory. Runs in a worker process."""
+    directory, force, wheel_cache, jobs = args
+    start = time.time()
+    result = run_in_dir(directory, build_here, force, wheel_cache, jobs)
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def build_all(function_dirs, concurrency, force=False, wheel_cache=False,
+              jobs=None):
+    """Build functions in a pool of processes, several at once.
+
+    Returns a summary of what happened to each function, ordered by
+    directory.
+    """
+    job_args = [(os.path.abspath(d), force, wheel_cache, jobs)
+                for d in function_dirs]
+    results = run_in_pool(build_in_dir, job_args, concurrency)
+    return sorted(results, key=lambda r: r['directory'])
@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+
+import os
+import tempfile
+import time
+from click import ClickException
+from concurrent.futures import ThreadPoolExecutor
+from lambkin.aws import THROTTLED_MAX_ATTEMPTS, get_client
+from lambkin.exceptions import get_error_message
+from lambkin.layer import get_layer_name, publish_layer_package
+from lambkin.pool import run_in_dir, run_in_pool
+from lambkin.publish import publish_package
+from lambkin.zip import create_layer_zip, create_zip
+import lambkin.metadata as metadata
+
+PUBLISH_SETTINGS = ('function', 'runtime', 'description', 'role', 'timeout',
+                    'memory', 's3_bucket', 'dependency_layer')
+
+
+def make_temporary_zip_path():
+    fd, zip_file_path = tempfile.mkstemp(prefix='lambkin-publish-',
+                                         suffix='.zip')
+    os.close(fd)
+    return zip_file_path
+
+
+def package_here(result, zip_options):
+    try:
+        metadata.get('description')
+    except KeyError:
+        raise ClickException('No description in metadata.json')
+    result['settings'] = dict(
+        (key, metadata.get(key)) for key in PUBLISH_SETTINGS)
+    dependency_layer = result['settings']['dependency_layer']
+    if dependency_layer:
+        result['layer_zip_file_path'] = make_temporary_zip_path()
+        result['layer_fingerprint'] = create_layer_zip(
+            result['layer_zip_file_path'], jobs=1, **zip_options)
+    result['zip_file_path'] = create_zip(
+        make_temporary_zip_path(), jobs=1,
+        dependencies=not dependency_layer, **zip_options)
+
+
+def package_function(args):
+    """Zip up the function in a directory. Runs in a worker process.
+
+    Returns a result dict with the function's settings and the path of
+    its zip file, or with an "error".
+    """
+    directory, zip_options = args
+    return run_in_dir(directory, package_here, zip_options)
+
+
+def publish_packaged(packaged, lmbda, s3_endpoint_url=None):
+    """Publish a function that package_function() has zipped."""
+    result = {
+        'directory': packaged['directory'],
+        'function': packaged['settings']['function'],
+    }
+    settings = dict(packaged['settings'])
+    layers = None
+    dropped_layer = None
+    if settings.pop('dependency_layer'):
+        layers = []
+    else:
+        dropped_layer = get_layer_name(settings['function'])
+    start = time.time()
+    try:
+        if packaged.get('layer_fingerprint'):
+            with open(packaged['layer_zip_file_path'], 'rb') as package:
+                layers.append(publish_layer_package(
+                    package, packaged['layer_fingerprint'],
+                    settings['function'], settings['runtime'],
+                    settings['s3_bucket'], s3_endpoint_url, lmbda=lmbda))
+        with open(packaged['zip_file_path'], 'rb') as package:
+            action, response = publish_package(
+                package, s3_endpoint_url=s3_endpoint_url, lmbda=lmbda,
+                layers=layers, dropped_layer=dropped_layer, **settings)
+        result['status'] = action
+        result['code_sha256'] = response.get('CodeSha256')
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = get_error_message(e)
+    finally:
+        for key in ('zip_file_path', 'layer_zip_file_path'):
+            if key in packaged:
+                os.remove(packaged[key])
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def publish_all(function_dirs, jobs, concurrency, zip_options,
+                s3_endpoint_url=None):
+    """Package functions in a process pool and publish them from threads.
+
+    Each function is published as soon as it has been packaged. Returns a
+    summary of what happened to each function, ordered by directory.
+    """
+    job_args = [(os.path.abspath(d), zip_options) for d in function_dirs]
+    results = []
+    futures = []
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    lmbda = get_client('lambda', max_pool_connections=concurrency,
+                       retries={'max_attempts': THROTTLED_MAX_ATTEMPTS})
+    try:
+        for packaged in run_in_pool(package_function, job_args, jobs,
+                                    ordered=False):
+            if 'error' in packaged:
+                results.append(packaged)
+            else:
+                futures.append(executor.submit(
+                    publish_packaged, packaged, lmbda, s3_endpoint_url))
+        results.extend(future.result() for future in futures)
+    finally:
+        executor.shutdown()
+    return sorted(results, key=lambda r: r['directory'])
@@ -0,0 +1,176 @@
+from __future__ import absolute_import
+
+import calendar
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from click import ClickException
+from lambkin.cache import get_cache_dir, mark_used, prune
+from lambkin.instrument import count, span
+from lambkin.ux import say
+from os.path import join
+from subprocess import check_output, CalledProcessError, Popen, PIPE
+
+WORKER_SCRIPT = join(os.path.dirname(os.path.abspath(__file__)),
+                     'bytecode_worker.py')
+
+# What to ship compiled bytecode for: nothing, only the packages in the
+# virtualenv, or every Python file.
+BYTECODE_MODES = ('none', 'dependencies', 'all')
+
+# Times how long it takes to import a module from a directory, leaving the
+# virtualenv's own packages out of the way, like Lambda would.
+IMPORT_TIMER = ('import sys, time; '
+                'sys.path = [sys.argv[1]] + [p for p in sys.path '
+                'if "-packages" not in p]; '
+                'start = time.time(); __import__(sys.argv[2]); '
+                'print(time.time() - start)')
+
+
+def get_python():
+    """Return the function's own interpreter, which suits its runtime."""
+    python = join('venv', 'bin', 'python')
+    if not os.path.exists(python):
+        raise ClickException('Bytecode is compiled with the function\'s '
+                             'virtualenv. Please run "lambkin build".')
+    return python
+
+
+def get_layout(python):
+    """Return the magic number and cache tag (if any) of an interpreter."""
+    return json.loads(check_output([python, WORKER_SCRIPT, '--layout']))
+
+
+def get_bytecode_arcname(arcname, cache_tag=None):
+    """Return where the bytecode for a source goes, beside it in the zip."""
+    if not cache_tag:
+        return arcname + 'c'
+    directory, name = os.path.split(arcname)
+    return join(directory, '__pycache__',
+                '%s.%s.pyc' % (os.path.splitext(name)[0], cache_tag))
+
+
+def compile_bytecode(requests, python, jobs=1):
+    """Compile sources with a few worker processes.
+
+    Returns the requests that failed, each with an "error".
+    """
+    chunks = [requests[i::jobs] for i in range(jobs) if requests[i::jobs]]
+    workers = []
+    for chunk in chunks:
+        with tempfile.TemporaryFile() as stdin:
+            for request in chunk:
+                stdin.write(json.dumps(request) + '\n')
+            stdin.seek(0)
+            workers.append(Popen([python, WORKER_SCRIPT], stdin=stdin,
+                                 stdout=PIPE))
+    failures = []
+    for worker in workers:
+        output = worker.communicate()[0]
+        if worker.returncode != 0:
+            raise ClickException('Bytecode compilation failed')
+        failures.extend(json.loads(line) for line in output.splitlines())
+    return failures
+
+
+def add_bytecode(files, mode, get_date_time, root='/var/task', jobs=1):
+    """Return files, plus compiled bytecode for the Python sources in them.
+
+    files are (path, arcname) pairs, and root is where Lambda will unpack
+    them. get_date_time(st) must return the timestamp that the zip will
+    give a file with stat result st.
+
+    With mode "dependencies", only sources from the virtualenv are
+    compiled. Compiled files are cached, so each source is only compiled
+    again when it changes.
+    """
+    if mode not in ('dependencies', 'all'):
+        return files
+    venv_prefix = join('.', 'venv', '')
+    sources = [(path, arcname) for path, arcname in files
+               if path.endswith('.py') and
+               (mode == 'all' or path.startswith(venv_prefix))]
+    if not sources:
+        return files
+    python = get_python()
+    layout = get_layout(python)
+    cache_dir = get_cache_dir('bytecode', layout['magic'])
+
+    requests = []
+    compiled = []
+    for path, arcname in sources:
+        st = os.stat(path)
+        # Lambda unpacks in UTC, so the timestamp from the zip becomes the
+        # source's mtime in UTC. That's what the bytecode has to match.
+        mtime = calendar.timegm(get_date_time(st))
+        dfile = join(root, os.path.normpath(arcname).lstrip('/'))
+        key = hashlib.sha1('%s %s %s %s %s' % (
+            os.path.abspath(path), st.st_size, st.st_mtime, dfile, mtime))
+        target = join(cache_dir, '%s.pyc' % key.hexdigest())
+        try:
+            mark_used(target, os.stat(target))
+        except OSError:
+            requests.append({'source': path, 'target': target,
+                             'dfile': dfile, 'mtime': mtime})
+        compiled.append((target, get_bytecode_arcname(
+            arcname, layout['cache_tag'])))
+
+    with span('bytecode.compile', files=len(requests), jobs=jobs):
+        failures = compile_bytecode(requests, python, jobs)
+    count('bytecode.compiled', len(requests))
+    count('bytecode.cached', len(compiled) - len(requests))
+    prune('bytecode')
+    failed_targets = set(f['target'] for f in failures)
+    for failure in failures:
+        say('Not compiling %s: %s' % (failure['source'], failure['error']))
+    return list(files) + [pair for pair in compiled
+                          if pair[0] not in failed_targets]
+
+
+def unpack(zip_path, directory, bytecode=True):
+    """Unpack a zip the way Lambda does, with timestamps taken as UTC."""
+    package = zipfile.ZipFile(zip_path)
+    try:
+        for info in package.infolist():
+            if not bytecode and info.filename.endswith('.pyc'):
+                continue
+            path = package.extract(info, directory)
+            mtime = calendar.timegm(info.date_time)
+            os.utime(path, (mtime, mtime))
+    finally:
+        package.close()
+
+
+def time_import(python, directory, module, runs=5):
+    """Return the median time, in seconds, to import module from directory."""
+    timings = []
+    for _ in range(runs):
+        try:
+            timings.append(float(check_output(
+                [python, '-B', '-c', IMPORT_TIMER, directory, module],
+                cwd=directory)))
+        except CalledProcessError:
+            raise ClickException('Could not import %s from the package.' %
+                                 module)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def benchmark_imports(zip_path, module, runs=5):
+    """Time a cold import of module from a package, with and without its
+    bytecode. Returns both times, in seconds.
+    """
+    python = os.path.abspath(get_python())
+    with_dir = tempfile.mkdtemp(prefix='lambkin-import-')
+    without_dir = tempfile.mkdtemp(prefix='lambkin-import-')
+    try:
+        unpack(zip_path, with_dir)
+        unpack(zip_path, without_dir, bytecode=False)
+        return (time_import(python, without_dir, module, runs),
+                time_import(python, with_dir, module, runs))
+    finally:
+        shutil.rmtree(with_dir)
+        shutil.rmtree(without_dir)
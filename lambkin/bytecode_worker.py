@@ -0,0 +1,84 @@
+"""Compile Python sources to bytecode, for "lambkin package --bytecode".
+
+This script runs under the function's own virtualenv interpreter, so that
+the bytecode suits the runtime. It must only use the standard library,
+and work on Python 2 and 3.
+
+    python bytecode_worker.py --layout
+
+prints the interpreter's magic number and cache tag, as JSON. Otherwise,
+each line of stdin is a JSON request:
+
+    {"source": "...", "target": "...", "dfile": "...", "mtime": 315532800}
+
+The source is compiled into the target file, with dfile as the file name
+shown in tracebacks, and mtime as the source's modification time (which
+must be what the source's mtime will be when Lambda unpacks it). Sources
+that fail to compile are reported on stdout, one JSON object per line,
+with the source, target and error.
+"""
+import json
+import marshal
+import os
+import struct
+import sys
+
+try:
+    from importlib.util import MAGIC_NUMBER as MAGIC
+except ImportError:
+    import imp
+    MAGIC = imp.get_magic()
+
+
+def get_cache_tag():
+    return getattr(sys.implementation, 'cache_tag', None) \
+        if hasattr(sys, 'implementation') else None
+
+
+def get_header(mtime, size):
+    if sys.version_info < (3, 3):
+        return MAGIC + struct.pack('<I', mtime)
+    elif sys.version_info < (3, 7):
+        return MAGIC + struct.pack('<II', mtime, size & 0xFFFFFFFF)
+    # PEP 552: a zero flags field means the pyc is validated by mtime.
+    return MAGIC + struct.pack('<III', 0, mtime, size & 0xFFFFFFFF)
+
+
+def compile_file(request):
+    with open(request['source'], 'rb') as f:
+        source = f.read()
+    size = len(source)
+    if sys.version_info < (3,):
+        # As py_compile does, by reading in universal newlines mode.
+        source = source.replace('\r\n', '\n').replace('\r', '\n')
+    code = compile(source, request['dfile'], 'exec', 0, True)
+    # Write beside the target, then rename, so a half-written file is
+    # never mistaken for a good one.
+    tmp_target = '%s.%d.tmp' % (request['target'], os.getpid())
+    with open(tmp_target, 'wb') as f:
+        f.write(get_header(request['mtime'], size))
+        f.write(marshal.dumps(code))
+    os.rename(tmp_target, request['target'])
+
+
+def main():
+    if sys.argv[1:] == ['--layout']:
+        print(json.dumps({
+            'magic': ''.join('%02x' % c for c in bytearray(MAGIC)),
+            'cache_tag': get_cache_tag(),
+        }))
+        return
+
+    for line in iter(sys.stdin.readline, ''):
+        request = json.loads(line)
+        try:
+            compile_file(request)
+        except (SyntaxError, ValueError, TypeError) as e:
+            sys.stdout.write(json.dumps({'source': request['source'],
+                                         'target': request['target'],
+                                         'error': str(e)}) + '\n')
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
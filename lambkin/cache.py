@@ -0,0 +1,81 @@
+import errno
+import os
+import time
+
+# Cached files that haven't been used for this many days are deleted, now
+# and then. Set LAMBKIN_CACHE_MAX_AGE to keep them for more or less time.
+MAX_AGE = float(os.environ.get('LAMBKIN_CACHE_MAX_AGE', 30)) * 24 * 3600
+
+# How often, in seconds, to look for files to delete. A file's mtime is
+# moved on when it is used, but no more often than this.
+PRUNE_INTERVAL = 24 * 3600
+
+# Marks when a cache dir was last pruned.
+PRUNE_STAMP = '.pruned'
+
+
+def get_cache_root():
+    """Return the root of Lambkin's per-user cache.
+
+    Honours LAMBKIN_CACHE_DIR, then XDG_CACHE_HOME, then ~/.cache.
+    """
+    if os.environ.get('LAMBKIN_CACHE_DIR'):
+        return os.environ['LAMBKIN_CACHE_DIR']
+    xdg_cache = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(xdg_cache, 'lambkin')
+
+
+def get_cache_dir(*parts):
+    """Return a directory inside the cache, creating it if needed."""
+    path = os.path.join(get_cache_root(), *parts)
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+
+def mark_used(path, st):
+    """Note that a cached file has been used, so that it isn't pruned.
+
+    st is the file's stat result. Its mtime is only moved on when it is
+    older than PRUNE_INTERVAL, to keep cache hits cheap.
+    """
+    if time.time() - st.st_mtime > PRUNE_INTERVAL:
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+
+def prune(*parts):
+    """Delete the files in a cache dir that haven't been used for MAX_AGE.
+
+    Does nothing if the dir was pruned less than PRUNE_INTERVAL ago.
+    Returns the number of files deleted.
+    """
+    path = get_cache_dir(*parts)
+    stamp = os.path.join(path, PRUNE_STAMP)
+    now = time.time()
+    try:
+        if now - os.stat(stamp).st_mtime < PRUNE_INTERVAL:
+            return 0
+    except OSError:
+        pass
+    with open(stamp, 'w'):
+        pass
+
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            file_path = os.path.join(dirpath, name)
+            try:
+                if name != PRUNE_STAMP and \
+                   now - os.stat(file_path).st_mtime > MAX_AGE:
+                    os.remove(file_path)
+                    removed += 1
+            except OSError:
+                # Another build may have got to it first.
+                pass
+    return removed
@@ -1,2 +1,9 @@
 class Fatal(Exception):
     pass
+
+
+def get_error_message(e):
+    """Return something to say about an exception in a summary, even when
+    it has no message of its own.
+    """
+    return str(e) or e.__class__.__name__
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+
+import json
+import os
+import tempfile
+import time
+from lambkin.aws import get_credentials_scope
+from lambkin.cache import get_cache_dir
+
+# How long, in seconds, a cached list of function names stays fresh.
+INDEX_TTL = 60
+
+
+def get_index_path(lmbda):
+    """Return the cache file for the account and region lmbda talks to."""
+    name = get_credentials_scope(lmbda.meta.region_name)
+    return os.path.join(get_cache_dir('functions'), '%s.json' % name)
+
+
+def list_function_names(lmbda):
+    """Return the names of all published functions, from every page."""
+    names = set()
+    for page in lmbda.get_paginator('list_functions').paginate():
+        names.update(f['FunctionName'] for f in page['Functions'])
+    return names
+
+
+def get_published_function_names(lmbda, ttl=INDEX_TTL):
+    """Return the set of published function names, cached for ttl seconds."""
+    index_path = get_index_path(lmbda)
+    try:
+        if time.time() - os.path.getmtime(index_path) < ttl:
+            with open(index_path) as f:
+                return set(json.load(f))
+    except (OSError, IOError, ValueError):
+        pass
+
+    names = list_function_names(lmbda)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(sorted(names), f)
+    os.rename(tmp_path, index_path)
+    return names
+
+
+def invalidate(lmbda):
+    """Forget the cached function names, after creating or deleting one."""
+    try:
+        os.remove(get_index_path(lmbda))
+    except OSError:
+        pass
+
+
+def get_published_configuration(lmbda, function):
+    """Return the live configuration of a function, or None if unpublished.
+
+    This is a single, direct probe, so it never suffers from a stale index.
+    """
+    from botocore.exceptions import ClientError
+    try:
+        return lmbda.get_function_configuration(FunctionName=function)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return None
+        else:
+            raise e
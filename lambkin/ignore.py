@@ -0,0 +1,151 @@
+from __future__ import absolute_import
+
+import os
+import re
+
+ignore_file = '.lambkinignore'
+
+# Patterns that are always left out of packages.
+default_patterns = [
+    '*.pyc',
+    '.git/',
+    '.lambkin-build',
+]
+
+# Dead weight that functions rarely need at runtime. Used with "--slim".
+slim_patterns = [
+    '*.pyo',
+    '__pycache__/',
+    '*.dist-info/',
+    '*.egg-info/',
+    'test/',
+    'tests/',
+    'doc/',
+    'docs/',
+    'examples/',
+    '*.c',
+    '*.h',
+    '*.pyx',
+    '*.pxd',
+]
+
+
+def translate_glob(pattern):
+    """Turn a glob into a regex that matches a path relative to the package.
+
+    "*", "?" and classes like "[abc]" or "[!abc]" don't cross directory
+    boundaries, but "**" does. A glob with no "/" in it can match at any
+    depth.
+    """
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    regex = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+            continue
+        elif pattern.startswith('**', i):
+            regex.append('.*')
+            i += 2
+            continue
+        elif c == '*':
+            regex.append('[^/]*')
+        elif c == '?':
+            regex.append('[^/]')
+        elif c == '[' and pattern.find(']', i + 2) > 0 and \
+                pattern[i + 1:pattern.find(']', i + 2)] != '!':
+            end = pattern.find(']', i + 2)
+            chars = pattern[i + 1:end].replace('\\', '\\\\')
+            if chars.startswith('!'):
+                # As in shell globs, "[!...]" matches what isn't listed.
+                chars = '^' + chars[1:]
+            elif chars.startswith('^'):
+                chars = '\\' + chars
+            # A class never matches the "/" between directories.
+            regex.append('(?!/)[%s]' % chars)
+            i = end
+        else:
+            regex.append(re.escape(c))
+        i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return '%s%s\\Z' % (prefix, ''.join(regex))
+
+
+class IgnoreRules(object):
+    """A compiled set of .lambkinignore patterns.
+
+    The syntax is a subset of .gitignore: a trailing "/" only matches
+    directories, a leading "!" puts back something that an earlier
+    pattern left out, and the last matching pattern wins. As with git,
+    nothing inside an ignored directory can be put back.
+    """
+
+    def __init__(self, patterns):
+        # Runs of patterns with the same sign are merged into one regex
+        # each, so a path is usually checked with only one or two matches.
+        runs = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negated = pattern.startswith('!')
+            pattern = pattern.lstrip('!')
+            dir_only = pattern.endswith('/')
+            regex = translate_glob(pattern.rstrip('/'))
+            if not runs or runs[-1][0] != negated:
+                runs.append((negated, [], []))
+            runs[-1][2 if dir_only else 1].append(regex)
+        # Checked last to first, since the last matching pattern wins.
+        self.groups = [
+            (run[0], self._compile(run[1]), self._compile(run[1] + run[2]))
+            for run in reversed(runs)]
+
+    def _compile(self, regexes):
+        if not regexes:
+            return None
+        return re.compile('|'.join('(?:%s)' % r for r in regexes))
+
+    def ignores(self, path, is_dir=False):
+        """Return True if path, relative to the package root, is left out."""
+        for negated, file_regex, dir_regex in self.groups:
+            regex = dir_regex if is_dir else file_regex
+            if regex and regex.match(path):
+                return not negated
+        return False
+
+
+def read_ignore_file(path=ignore_file):
+    """Return the patterns in a .lambkinignore file, if there is one."""
+    try:
+        with open(path) as f:
+            return f.read().splitlines()
+    except IOError:
+        return []
+
+
+def get_ignore_rules(slim=False):
+    """Return the rules for the function in the current dir."""
+    patterns = list(default_patterns)
+    if slim:
+        patterns.extend(slim_patterns)
+    patterns.extend(read_ignore_file())
+    return IgnoreRules(patterns)
+
+
+def get_ignored_size(paths):
+    """Return the number of files, and bytes, in some ignored paths."""
+    files = 0
+    size = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                for name in names:
+                    files += 1
+                    size += os.lstat(os.path.join(root, name)).st_size
+        else:
+            files += 1
+            size += os.lstat(path).st_size
+    return files, size
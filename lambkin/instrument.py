@@ -0,0 +1,87 @@
+"""Timing spans and counters, for finding out where the time goes.
+
+Spans and counters are always recorded, since they are cheap. They are
+only written out when asked for, with "lambkin --profile=trace.json".
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_spans = []
+_counters = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def span(name, **args):
+    """Record how long the enclosed block takes, as a named span."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        record = {
+            'name': name,
+            'start': start,
+            'duration': time.time() - start,
+            'pid': os.getpid(),
+            'tid': threading.current_thread().ident,
+            'args': args,
+        }
+        with _lock:
+            _spans.append(record)
+
+
+def count(name, value=1):
+    """Add value to a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get_report():
+    """Return spans and counters as a plain, JSON-friendly dict."""
+    return {
+        'spans': [{
+            'name': s['name'],
+            'start': s['start'],
+            'duration_ms': round(s['duration'] * 1000, 3),
+            'args': s['args'],
+        } for s in _spans],
+        'counters': dict(_counters),
+    }
+
+
+def get_chrome_trace():
+    """Return spans and counters in Chrome's trace event format.
+
+    Load the file at chrome://tracing, or in any compatible viewer.
+    """
+    events = [{
+        'name': s['name'],
+        'ph': 'X',
+        'ts': int(s['start'] * 1e6),
+        'dur': int(s['duration'] * 1e6),
+        'pid': s['pid'],
+        'tid': s['tid'],
+        'args': s['args'],
+    } for s in _spans]
+    end = max([s['start'] + s['duration'] for s in _spans] or [time.time()])
+    events.extend({
+        'name': name,
+        'ph': 'C',
+        'ts': int(end * 1e6),
+        'pid': os.getpid(),
+        'args': {name: value},
+    } for name, value in sorted(_counters.items()))
+    return {'traceEvents': events}
+
+
+def write_profile(path, trace_format='json'):
+    """Write everything recorded so far to path."""
+    if trace_format == 'chrome':
+        data = get_chrome_trace()
+    else:
+        data = get_report()
+    with open(path, 'w') as f:
+        json.dump(data, f, sort_keys=True, indent=2)
@@ -1,57 +1,86 @@
 #!/usr/bin/env python
 from __future__ import absolute_import
 
-import boto3
 import click
 from click import ClickException
 import json
+import multiprocessing
 import os
 import platform
 import sys
+import time
 from base64 import b64decode
-from botocore.exceptions import ClientError
-from botocore.config import Config
-from lambkin.aws import get_role_arn, get_event_rule_arn
-from lambkin.aws import get_function_arn, get_region
+from lambkin.aws import get_client, get_function_arn
+from lambkin.build import build_all, build_function
+from lambkin.bulk import publish_all
+from lambkin.bytecode import BYTECODE_MODES, benchmark_imports
 from lambkin.runtime import get_sane_runtime, get_file_extension_for_runtime
 from lambkin.runtime import get_language_name_for_runtime
+from lambkin.schedules import apply_manifest, read_manifest
+from lambkin.schedules import get_rule_name, get_schedule_expression
 from lambkin.template import render_template
+from lambkin.tune import DEFAULT_MEMORY_SIZES, recommend, tune_function
 from lambkin.ux import say
 from lambkin.version import VERSION
-from lambkin.virtualenv import create_virtualenv, run_in_virtualenv
-from lambkin.zip import create_zip
+from lambkin.virtualenv import create_virtualenv
+from lambkin.warm import keep_warm
+from lambkin.watch import POLL_INTERVAL, get_snapshot, wait_for_changes
+from lambkin.zip import create_zip, get_code_sha256
+from lambkin.ignore import get_ignored_size
+from lambkin.layer import get_layer_name, publish_dependency_layer
+from lambkin.loadtest import read_payloads, run_load_test
+from lambkin.local import invoke_local, read_events
+from lambkin.publish import publish_package, wait_for_update
+from lambkin.report import parse_report
+from lambkin.upload import SPOOL_SIZE
+from lambkin.zipcache import get_compression_level
+from lambkin.instrument import span, write_profile
+import lambkin.function_index as function_index
 import lambkin.metadata as metadata
-from subprocess import check_output, CalledProcessError, STDOUT
+from tempfile import SpooledTemporaryFile
 
-lmbda = boto3.client('lambda', region_name=get_region())
 
-
-@click.command(help='Make a new Lambda function from a basic template.')
-@click.argument('function')
+@click.command(help='Make new Lambda functions from a basic template.')
+@click.argument('functions', nargs=-1, required=True)
 @click.option('--runtime', help='The language runtime to use. eg. "python2.7".')
-def create(function, runtime):
+@click.option('--no-venv-cache', is_flag=True,
+              help="Build each virtualenv from scratch, instead of cloning a cached one.")
+def create(functions, runtime, no_venv_cache):
     runtime = get_sane_runtime(runtime)
+    ext = get_file_extension_for_runtime(runtime)
+
+    for function in functions:
+        for path in (function, os.path.join(function, '%s.%s' % (function, ext))):
+            if os.path.exists(path):
+                raise ClickException('Path "%s" already exists.' % path)
+    if len(set(functions)) != len(functions):
+        raise ClickException('Please name each function only once.')
+
+    for function in functions:
+        create_function(function, runtime, use_venv_cache=not no_venv_cache)
+
 
+def create_function(function, runtime, use_venv_cache=True):
+    """Make a new function, in a directory of the same name."""
     ext = get_file_extension_for_runtime(runtime)
     func_dir = function
     func_file = os.path.join(func_dir, '%s.%s' % (function, ext))
 
-    for path in (func_dir, func_file):
-        if os.path.exists(path):
-            raise ClickException('Path "%s" already exists.' % path)
-
     os.mkdir(func_dir)
 
     template_name = get_language_name_for_runtime(runtime)
-    render_template(template_name, function,
-                    output_filename="%s.%s" % (function, ext))
+    with span('create.templates'):
+        render_template(template_name, function,
+                        output_filename="%s.%s" % (function, ext))
     if get_language_name_for_runtime(runtime) == 'python':
-        create_virtualenv(function)
-        render_template('requirements', function, output_filename='requirements.txt')
-        render_template('gitignore-python', function, output_filename='.gitignore')
+        create_virtualenv(function, use_cache=use_venv_cache)
+        with span('create.templates'):
+            render_template('requirements', function, output_filename='requirements.txt')
+            render_template('gitignore-python', function, output_filename='.gitignore')
     else:
-        render_template('makefile', function, output_filename='Makefile')
-        render_template('gitignore', function, output_filename='.gitignore')
+        with span('create.templates'):
+            render_template('makefile', function, output_filename='Makefile')
+            render_template('gitignore', function, output_filename='.gitignore')
 
     our_metadata = {
         'function': function,
@@ -64,37 +93,72 @@ def create(function, runtime):
     say('%s created as %s' % (function, func_file))
 
 
-def get_published_function_names():
-    """Return the names of all published functions."""
-    return [f['FunctionName'] for f in lmbda.list_functions()['Functions']]
-
-
 @click.command(name='list-published',
                help='List published Lambda functions.')
 def list_published():
-    for f in lmbda.list_functions()['Functions']:
-        print f['FunctionName']
+    lmbda = get_client('lambda')
+    for name in sorted(function_index.get_published_function_names(lmbda)):
+        print name
 
 
 @click.command(help="Run the build process for a function.")
-def build():
-    runtime = metadata.get('runtime')
-    language = get_language_name_for_runtime(runtime)
-    if language == 'python':
-        # Use virtualenv and pip
-        if not os.path.isfile('venv'):
-            create_virtualenv('.')
-        print run_in_virtualenv('pip install -r requirements.txt')
-    else:
-        # Fall back to a Makefile.
-        try:
-            make_log = check_output(['make'], stderr=STDOUT)
-            for line in make_log.rstrip().split("\n"):
-                say(line)
-        except CalledProcessError as e:
-            for line in e.output.rstrip().split("\n"):
-                say(line)
-            raise ClickException('make failure')
+@click.option('--force', is_flag=True,
+              help="Install dependencies, or run make, even if nothing has changed.")
+@click.option('--wheel-cache', is_flag=True,
+              help="Install Python packages from a local wheel cache shared by all functions.")
+@click.option('-j', '--jobs', type=click.IntRange(min=1),
+              help="Number of jobs make may run at once, as with make -j.")
+@click.option('--all', 'all_functions', is_flag=True,
+              help="Build every function found below the current dir.")
+@click.option('--concurrency', type=click.IntRange(min=1), default=multiprocessing.cpu_count,
+              help="Number of functions to build at once with --all. Default: number of CPUs.")
+def build(force, wheel_cache, jobs, all_functions, concurrency):
+    if all_functions:
+        function_dirs = metadata.find_function_dirs()
+        if not function_dirs:
+            raise ClickException('No functions found below the current dir.')
+        results = build_all(function_dirs, concurrency, force, wheel_cache,
+                            jobs)
+        print json.dumps(results, sort_keys=True, indent=2)
+        failed = [r.get('function') or r['directory'] for r in results
+                  if r['status'] == 'failed']
+        if failed:
+            raise ClickException('Failed to build: %s' % ', '.join(failed))
+        return
+    build_function(force, wheel_cache, jobs)
+
+
+@click.command(help='Build the deployment package for a function.')
+@click.option('--zip-file-path', help="Name of zip file that lambkin creates. Default: /tmp/lambkin-publish-<function>.zip.")
+@click.option('--no-zip-cache', is_flag=True, help="Compress every file from scratch, ignoring the build cache.")
+@click.option('--compression', help='Zip compression: "fast", "default", "best" or a level from 0 to 9.')
+@click.option('--jobs', type=click.IntRange(min=1), default=multiprocessing.cpu_count,
+              help="Number of processes used to compress files. Default: number of CPUs.")
+@click.option('--reproducible/--no-reproducible', default=True,
+              help="Sort entries, and normalize timestamps and modes, so that the same files always make the same zip. Default: on.")
+@click.option('--bytecode', type=click.Choice(BYTECODE_MODES),
+              help="Ship compiled bytecode for all Python files, only for dependencies, or none. Default: as last published.")
+@click.option('--import-benchmark', is_flag=True,
+              help="Time a cold import of the function from the package, with and without its bytecode.")
+@click.option('--hash', 'show_hash', is_flag=True,
+              help="Print the package's SHA-256, as Lambda reports it in CodeSha256.")
+def package(zip_file_path, no_zip_cache, compression, jobs, reproducible,
+            bytecode, import_benchmark, show_hash):
+    zip_file_path = create_zip(
+        zip_file_path, use_cache=not no_zip_cache, jobs=jobs,
+        level=get_compression_level(compression),
+        dependencies=not metadata.get('dependency_layer'),
+        reproducible=reproducible, bytecode=bytecode)
+    say('Package written to %s' % zip_file_path)
+    if import_benchmark:
+        without, with_bytecode = benchmark_imports(
+            zip_file_path, metadata.get('function'))
+        say('Import took %.1fms without bytecode, and %.1fms with it '
+            '(%.1fms saved)' % (without * 1000, with_bytecode * 1000,
+                                (without - with_bytecode) * 1000))
+    if show_hash:
+        with open(zip_file_path, 'rb') as f:
+            print get_code_sha256(f)
 
 
 @click.command(help='Publish a function to Lambda.')
@@ -104,81 +168,338 @@ def build():
 @click.option('--memory', type=click.IntRange(min=128, max=1536),
               help="Memory allocated to the function, in MiB.")
 @click.option('--role', help="Lambda execution role. Default: lambda_basic_execution")
-@click.option('--zip-file-path', help="Name of zip file that lambkin creates. Default: /tmp/lambkin-publish-<function>.zip.")
+@click.option('--zip-file-path', help="Name of zip file that lambkin creates. By default, the zip is built in memory, or written to /tmp/lambkin-publish-<function>.zip with --zip-file-only.")
 @click.option('--zip-file-only', is_flag=True, help="Produce zip file and exit without publishing.")
-def publish(description, timeout, memory, role, zip_file_only, zip_file_path):
+@click.option('--no-zip-cache', is_flag=True, help="Compress every file from scratch, ignoring the build cache.")
+@click.option('--compression', help='Zip compression: "fast", "default", "best" or a level from 0 to 9.')
+@click.option('--jobs', type=click.IntRange(min=1), default=multiprocessing.cpu_count,
+              help="Number of processes used to compress files, or to package functions with --all. Default: number of CPUs.")
+@click.option('--reproducible/--no-reproducible', default=True,
+              help="Sort entries, and normalize timestamps and modes, so that the same files always make the same zip. Default: on.")
+@click.option('--s3-bucket', help="Stage the package in this S3 bucket, instead of uploading it directly.")
+@click.option('--s3-endpoint-url', envvar='LAMBKIN_S3_ENDPOINT_URL',
+              help="Use an alternative S3 endpoint, like a local S3 stand-in.")
+@click.option('--dependency-layer/--no-dependency-layer', default=None,
+              help="Publish dependencies as a separate Lambda layer, leaving only your own code in the function.")
+@click.option('--slim/--no-slim', default=None,
+              help="Leave tests, docs, package metadata and other dead weight out of the package.")
+@click.option('--show-ignored', is_flag=True,
+              help="Report how much was left out of the package by .lambkinignore and --slim.")
+@click.option('--bytecode', type=click.Choice(BYTECODE_MODES),
+              help="Ship compiled bytecode for all Python files, only for dependencies, or none, to speed up cold starts. Default: none.")
+@click.option('--all', 'all_functions', is_flag=True,
+              help="Publish every function found below the current dir, using each one's metadata.")
+@click.option('--concurrency', type=click.IntRange(min=1), default=8,
+              help="Number of functions to publish at once with --all. Default: 8.")
+def publish(description, timeout, memory, role, zip_file_only, zip_file_path,
+            no_zip_cache, compression, jobs, reproducible, s3_bucket,
+            s3_endpoint_url, dependency_layer, slim, show_ignored,
+            bytecode, all_functions, concurrency):
+    zip_options = dict(use_cache=not no_zip_cache,
+                       level=get_compression_level(compression),
+                       reproducible=reproducible)
+
+    if all_functions:
+        if description or timeout or memory or role or s3_bucket or \
+           zip_file_path or zip_file_only or dependency_layer is not None or \
+           slim is not None or show_ignored or bytecode:
+            raise ClickException(
+                '"--all" publishes each function with its own metadata. '
+                'Please set options for each function separately.')
+        publish_all_functions(jobs, concurrency, zip_options, s3_endpoint_url)
+        return
+
     runtime = metadata.get('runtime')
     function = metadata.get('function')
 
-    if description:
-        metadata.update(description=description)
-    else:
-        try:
-            description = metadata.get('description')
-        except KeyError:
-            raise ClickException('Please provide a description with "--description"')
+    # Save any new settings in a single write, before they get zipped.
+    with metadata.batched_updates():
+        if description:
+            metadata.update(description=description)
+        else:
+            try:
+                description = metadata.get('description')
+            except KeyError:
+                raise ClickException('Please provide a description with "--description"')
 
-    if timeout:
-        metadata.update(timeout=timeout)
-    else:
-        timeout = metadata.get('timeout')
+        if timeout:
+            metadata.update(timeout=timeout)
+        else:
+            timeout = metadata.get('timeout')
 
-    if memory:
-        metadata.update(memory=memory)
-    else:
-        memory = metadata.get('memory')
+        if memory:
+            metadata.update(memory=memory)
+        else:
+            memory = metadata.get('memory')
+
+        if role:
+            metadata.update(role=role)
+        else:
+            role = metadata.get('role')
 
-    if role:
-        metadata.update(role=role)
+        if s3_bucket:
+            metadata.update(s3_bucket=s3_bucket)
+        else:
+            s3_bucket = metadata.get('s3_bucket')
+
+        if dependency_layer is not None:
+            metadata.update(dependency_layer=dependency_layer)
+        else:
+            dependency_layer = metadata.get('dependency_layer')
+
+        if slim is not None:
+            metadata.update(slim=slim)
+
+        if bytecode:
+            metadata.update(bytecode=bytecode)
+
+    zip_options['jobs'] = jobs
+    if show_ignored:
+        zip_options['ignored'] = []
+    layers = None
+    dropped_layer = None
+    if dependency_layer and not zip_file_only:
+        layers = publish_dependency_layer(function, runtime, zip_options,
+                                          s3_bucket, s3_endpoint_url)
+    elif not dependency_layer:
+        # The dependencies are back in the function, perhaps after being in
+        # a layer.
+        dropped_layer = get_layer_name(function)
+
+    zip_options['dependencies'] = not dependency_layer
+    if zip_file_path or zip_file_only:
+        zip_file_path = create_zip(zip_file_path, **zip_options)
+        if show_ignored:
+            say_ignored(zip_options['ignored'])
+        if zip_file_only:
+            return
+        package = open(zip_file_path, 'rb')
     else:
-        role = metadata.get('role')
+        # Skip the round trip through the filesystem for small packages.
+        package = create_zip(SpooledTemporaryFile(max_size=SPOOL_SIZE),
+                             **zip_options)
+        if show_ignored:
+            say_ignored(zip_options['ignored'])
+
+    with package:
+        action, final_response = publish_package(
+            package, function, runtime, description, role, timeout, memory,
+            s3_bucket, s3_endpoint_url, layers=layers,
+            dropped_layer=dropped_layer)
+    print json.dumps(final_response, sort_keys=True, indent=2)
 
-    zip_data = open(create_zip(zip_file_path)).read()
 
-    if zip_file_only:
-        return
+def say_ignored(ignored):
+    files, size = get_ignored_size(ignored)
+    say('Left %d files (%.1f MiB) out of the package' %
+        (files, size / (1024.0 * 1024)))
 
-    if function in get_published_function_names():
-        # Push the latest code to the existing function in Lambda.
-        update_code_response = lmbda.update_function_code(
-            FunctionName=function,
-            ZipFile=zip_data,
-            Publish=True)
-
-        # Update any settings for the function too.
-        final_response = lmbda.update_function_configuration(
-            FunctionName=function,
-            Description=description,
-            Role=get_role_arn(role),
-            Timeout=timeout,
-            MemorySize=memory)
-        say('%s updated in Lambda' % function)
-    else:  # we need to explictly create the function in AWS.
-        final_response = lmbda.create_function(
-            FunctionName=function,
-            Description=description,
-            Runtime=runtime,
-            Role=get_role_arn(role),
-            Handler='%s.handler' % function,
-            Code={'ZipFile': zip_data},
-            Timeout=timeout,
-            MemorySize=memory)
-        say('%s created in Lambda' % function)
-    print json.dumps(final_response, sort_keys=True, indent=2)
+
+def publish_all_functions(jobs, concurrency, zip_options, s3_endpoint_url):
+    """Publish every function below the current dir, printing a summary."""
+    function_dirs = metadata.find_function_dirs()
+    if not function_dirs:
+        raise ClickException('No functions found below the current dir.')
+
+    results = publish_all(function_dirs, jobs, concurrency, zip_options,
+                          s3_endpoint_url)
+    print json.dumps(results, sort_keys=True, indent=2)
+
+    failures = [r for r in results if r['status'] == 'failed']
+    if failures:
+        raise ClickException('%d of %d functions failed to publish' %
+                             (len(failures), len(results)))
 
 
 @click.command(help='Run a published function.')
 @click.option('--function', help="Defaults to the function in the current dir.")
-def run(function):
-    lmbda = boto3.client('lambda', region_name=get_region(),
-                         config=Config(retries={'max_attempts': 1}, read_timeout=310))
+@click.option('--payload-file', type=click.Path(exists=True, dir_okay=False),
+              help="JSON Lines file of events to send. A single run sends the first one.")
+@click.option('--metrics', is_flag=True,
+              help="Print the payload as JSON, together with the metrics from Lambda's REPORT line.")
+@click.option('--count', type=click.IntRange(min=1),
+              help="Load test: invoke the function this many times and report latency as JSON.")
+@click.option('--concurrency', type=click.IntRange(min=1),
+              help="Load test: number of invocations to keep in flight. Default: 1.")
+def run(function, payload_file, metrics, count, concurrency):
     if not function:
         function = metadata.get('function')
-    result = lmbda.invoke(FunctionName=function, LogType='Tail')
-    log = b64decode(result['LogResult']).rstrip().split("\n")
-    for line in log:
+    payloads = read_payloads(payload_file) if payload_file else []
+
+    if count or concurrency:
+        summary = run_load_test(function, count or 1, concurrency or 1,
+                                payloads)
+        print json.dumps(summary, sort_keys=True, indent=2)
+        return
+
+    lmbda = get_client('lambda', retries={'max_attempts': 1}, read_timeout=310)
+    payload, log = invoke_function(lmbda, function,
+                                   payloads[0] if payloads else None)
+
+    if metrics:
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            pass
+        print json.dumps({'payload': payload, 'metrics': parse_report(log)},
+                         sort_keys=True, indent=2)
+    else:
+        print payload
+
+
+def invoke_function(lmbda, function, payload=None):
+    """Invoke a function, echoing its log. Returns its payload and log."""
+    kwargs = {'Payload': payload} if payload is not None else {}
+    with span('run.invoke', function=function):
+        result = lmbda.invoke(FunctionName=function, LogType='Tail', **kwargs)
+    log = b64decode(result['LogResult'])
+    for line in log.rstrip().split("\n"):
         say(line)
-    print result['Payload'].read()
+    return result['Payload'].read(), log
+
+
+@click.command(help='Build, publish and run a function, again whenever it changes.')
+@click.option('--watch', is_flag=True,
+              help="Keep watching the function's files, and go again whenever they change.")
+@click.option('--run', 'run_after', is_flag=True,
+              help="Run the function after each publish.")
+@click.option('--payload-file', type=click.Path(exists=True, dir_okay=False),
+              help="JSON Lines file whose first event is sent by --run.")
+@click.option('--wheel-cache', is_flag=True,
+              help="Install Python packages from a local wheel cache shared by all functions.")
+@click.option('--interval', type=float, default=POLL_INTERVAL,
+              help="Seconds between checks for changes. Default: %s." % POLL_INTERVAL)
+@click.option('--s3-endpoint-url', envvar='LAMBKIN_S3_ENDPOINT_URL',
+              help="Use an alternative S3 endpoint, like a local S3 stand-in.")
+def dev(watch, run_after, payload_file, wheel_cache, interval,
+        s3_endpoint_url):
+    function = metadata.get('function')
+    try:
+        metadata.get('description')
+    except KeyError:
+        raise ClickException(
+            'Please publish once with "lambkin publish --description"')
+    payload = read_payloads(payload_file)[0] if payload_file else None
+    # One client for the whole session, so its connections stay open.
+    lmbda = get_client('lambda', read_timeout=310)
+
+    def cycle(changed):
+        start = time.time()
+        layers = None
+        dropped_layer = None
+        if not metadata.get('dependency_layer'):
+            dropped_layer = get_layer_name(function)
+        # Python dependencies only need a look when requirements change.
+        # Anything else is left to make, which knows what's out of date.
+        if changed is None or './requirements.txt' in changed or \
+           get_language_name_for_runtime(metadata.get('runtime')) != 'python':
+            rebuilt = build_function(wheel_cache=wheel_cache)
+            if (rebuilt or changed is None) and \
+               metadata.get('dependency_layer'):
+                layers = publish_dependency_layer(
+                    function, metadata.get('runtime'),
+                    dict(jobs=multiprocessing.cpu_count()),
+                    metadata.get('s3_bucket'), s3_endpoint_url)
+
+        package = create_zip(
+            SpooledTemporaryFile(max_size=SPOOL_SIZE),
+            jobs=multiprocessing.cpu_count(),
+            dependencies=not metadata.get('dependency_layer'))
+        with package:
+            action, final_response = publish_package(
+                package, function, metadata.get('runtime'),
+                metadata.get('description'), metadata.get('role'),
+                metadata.get('timeout'), metadata.get('memory'),
+                metadata.get('s3_bucket'), s3_endpoint_url, lmbda=lmbda,
+                layers=layers, dropped_layer=dropped_layer)
+        say('Done in %.1fs' % (time.time() - start))
+
+        if run_after:
+            if action == 'created':
+                wait_for_update(lmbda, function, 'function_active')
+            elif action == 'updated':
+                wait_for_update(lmbda, function)
+            print invoke_function(lmbda, function, payload)[0]
+
+    def safe_cycle(changed):
+        with span('dev.cycle'):
+            try:
+                cycle(changed)
+            except Exception as e:
+                if not watch:
+                    raise
+                # Keep watching. The next save might well fix it.
+                say('Error: %s' % (e.message if isinstance(e, ClickException) else e))
+
+    snapshot = get_snapshot()
+    safe_cycle(None)
+    while watch:
+        say('Watching for changes. Press Ctrl-C to stop.')
+        snapshot, changed = wait_for_changes(snapshot, interval)
+        say('Changed: %s' % ', '.join(sorted(changed)))
+        safe_cycle(changed)
+
+
+@click.command(help='Find the best memory size for a published function.')
+@click.option('--memory', type=click.IntRange(min=128, max=1536), multiple=True,
+              help="A memory size to try, in MiB. Repeat to try several. Default: 128 to 1536.")
+@click.option('--count', type=click.IntRange(min=1), default=10,
+              help="Invocations at each memory size. Default: 10.")
+@click.option('--concurrency', type=click.IntRange(min=1), default=1,
+              help="Invocations in flight at each memory size. Default: 1.")
+@click.option('--payload-file', type=click.Path(exists=True, dir_okay=False),
+              help="JSON Lines file of representative events to send.")
+@click.option('--strategy', type=click.Choice(['cost', 'speed']), default='cost',
+              help="Recommend the cheapest or the fastest memory size. Default: cost.")
+@click.option('--apply', is_flag=True,
+              help="Save the recommended memory size in the function's metadata.")
+@click.option('--endpoint-url', envvar='LAMBKIN_LAMBDA_ENDPOINT_URL',
+              help="Use an alternative Lambda endpoint, like a local Lambda stand-in.")
+def tune(memory, count, concurrency, payload_file, strategy, apply,
+         endpoint_url):
+    function = metadata.get('function')
+    memory_sizes = sorted(set(memory)) or DEFAULT_MEMORY_SIZES
+    payloads = read_payloads(payload_file) if payload_file else []
+    lmbda = get_client('lambda', endpoint_url=endpoint_url,
+                       retries={'max_attempts': 1}, read_timeout=310,
+                       max_pool_connections=concurrency * len(memory_sizes))
+
+    results = tune_function(lmbda, function, memory_sizes, count,
+                            concurrency, payloads)
+    recommendation = recommend(results, strategy)
+    print json.dumps({'results': results, 'recommendation': recommendation},
+                     sort_keys=True, indent=2)
+
+    if not recommendation:
+        raise ClickException('Every memory size had errors. Nothing to recommend.')
+    if apply:
+        metadata.update(memory=recommendation['memory'])
+        say('Memory set to %d MiB. Run "lambkin publish" to apply it.' %
+            recommendation['memory'])
+
+
+@click.command(name='invoke-local',
+               help='Run the function locally, in warm worker processes.')
+@click.option('--events', type=click.File('r'),
+              help='JSON Lines file of events to send, or "-" for stdin. Default: a single empty event.')
+@click.option('--workers', type=click.IntRange(min=1), default=1,
+              help="Number of warm worker processes. Default: 1.")
+def invoke_local_command(events, workers):
+    function = metadata.get('function')
+    if get_language_name_for_runtime(metadata.get('runtime')) != 'python':
+        raise ClickException('invoke-local only supports Python functions.')
+
+    if events:
+        requests = read_events(events)
+    else:
+        requests = [(1, {})]
+
+    def print_response(response):
+        print json.dumps(response, sort_keys=True)
+        sys.stdout.flush()
+
+    invoke_local(function, requests, metadata.get('memory'),
+                 metadata.get('timeout'), workers, print_response)
 
 
 @click.command(help='Remove a function from Lambda.')
@@ -186,60 +507,74 @@ def run(function):
 def unpublish(function):
     if not function:
         function = metadata.get('function')
+    lmbda = get_client('lambda')
     lmbda.delete_function(FunctionName=function)
+    function_index.invalidate(lmbda)
     say('%s unpublished' % (function))
 
 
+def start_profiling(ctx, profile_path, profile_format, cprofile_path):
+    """Profile the rest of the command, writing results when it ends."""
+    command_span = span('lambkin %s' % ctx.invoked_subcommand)
+    command_span.__enter__()
+    if cprofile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        command_span.__exit__(None, None, None)
+        if cprofile_path:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if profile_path:
+            write_profile(profile_path, profile_format)
+
+    ctx.call_on_close(finish)
+
+
 @click.command(help='Schedule a function to run regularly.')
 @click.option('--function', help="Defaults to the function in the current dir.")
 @click.option('--rate', help='Execution rate. Like "6 minutes", or "1 day".')
 @click.option('--cron', help='Cron schedule. Like "0 8 1 * ? *".')
-def schedule(function, rate, cron):
+@click.option('--manifest', type=click.File(),
+              help="JSON file of many schedules to apply at once. See README.md.")
+@click.option('--concurrency', type=click.IntRange(min=1), default=8,
+              help="Number of AWS calls in flight at once. Default: 8.")
+def schedule(function, rate, cron, manifest, concurrency):
+    if manifest:
+        if function or rate or cron:
+            raise ClickException(
+                'Please put schedules in the manifest, or use "--function", '
+                '"--rate" and "--cron", but not both.')
+        rules = read_manifest(manifest)
+    else:
+        if not function:
+            function = metadata.get('function')
+        rules = {get_rule_name(function): {
+            'expression': get_schedule_expression(rate, cron),
+            'targets': [{'Id': function, 'Arn': get_function_arn(function)}],
+        }}
+
+    results = apply_manifest(rules, concurrency)
+    print json.dumps(results, sort_keys=True, indent=2)
+    failed = [r['rule'] for r in results if r['status'] == 'failed']
+    if failed:
+        raise ClickException('Failed to schedule: %s' % ', '.join(failed))
+
+
+@click.command(name='keep-warm',
+               help='Ping a function regularly, so that it rarely starts cold.')
+@click.option('--function', help="Defaults to the function in the current dir.")
+@click.option('--concurrency', type=click.IntRange(min=0), default=1,
+              help="Number of pings sent at once, to keep that many instances warm. 0 stops the pings. Default: 1.")
+@click.option('--every', default='5m',
+              help='Time between pings. Like "5m", "1h" or "1 day". Default: 5m.')
+def keep_warm_command(function, concurrency, every):
     if not function:
         function = metadata.get('function')
-    events = boto3.client('events', region_name=get_region())
-
-    if (rate and cron):
-        raise ClickException(
-            'Please use either "--rate" or "--cron", not both.')
-    if rate:
-        schedule_expression = 'rate(%s)' % rate
-    elif cron:
-        schedule_expression = 'cron(%s)' % cron
-    else:
-        raise ClickException('Please provide "--rate" or "--cron".')
-
-    try:
-        lmbda.add_permission(
-            FunctionName=function,
-            StatementId='lambkin-allow-cloudwatch-invoke-%s' % function,
-            Action='lambda:InvokeFunction',
-            Principal='events.amazonaws.com',
-            SourceArn=get_event_rule_arn('lambkin-cron-%s' % function),
-        )
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ResourceConflictException':
-            # The rule is already there. Carry on!
-            pass
-        else:
-            raise e
-
-    events.put_rule(
-        Name='lambkin-cron-%s' % function,
-        ScheduleExpression=schedule_expression,
-        State='ENABLED',
-        Description='Lambkin cron for %s Lambda function' % function,
-    )
-
-    response = events.put_targets(
-        Rule='lambkin-cron-%s' % function,
-        Targets=[{
-            'Id': function,
-            'Arn': get_function_arn(function),
-        }]
-    )
-
-    print json.dumps(response, sort_keys=True, indent=2)
+    results = keep_warm(function, concurrency, every)
+    print json.dumps(results, sort_keys=True, indent=2)
 
 
 def main():
@@ -250,11 +585,20 @@ def main():
     @click.group(invoke_without_command=True, no_args_is_help=True)
     @click.pass_context
     @click.option('--version', help='Show the version.', is_flag=True)
-    def cli(ctx, version):
+    @click.option('--profile', 'profile_path', type=click.Path(dir_okay=False),
+                  help='Write timings of each phase of the command to this file.')
+    @click.option('--profile-format', type=click.Choice(['json', 'chrome']),
+                  default='json', help='Format for --profile. "chrome" is for chrome://tracing. Default: json.')
+    @click.option('--cprofile', 'cprofile_path', type=click.Path(dir_okay=False),
+                  help='Write cProfile statistics for the command to this file.')
+    def cli(ctx, version, profile_path, profile_format, cprofile_path):
         if ctx.invoked_subcommand is None and version:
             click.echo(VERSION)
+        if profile_path or cprofile_path:
+            start_profiling(ctx, profile_path, profile_format, cprofile_path)
 
-    subcommands = [create, list_published, build, publish, run, schedule,
+    subcommands = [create, list_published, build, dev, invoke_local_command,
+                   keep_warm_command, package, publish, run, schedule, tune,
                    unpublish]
     for cmd in subcommands:
         cli.add_command(cmd)
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+
+from lambkin.aws import get_client
+from lambkin.upload import get_code, SPOOL_SIZE
+from lambkin.ux import say
+from lambkin.zip import create_layer_zip, get_code_sha256
+from tempfile import SpooledTemporaryFile
+
+# REF: http://docs.aws.amazon.com/lambda/latest/dg/configuration-layers.html
+
+
+def get_layer_name(function):
+    """Return the name of the layer that holds a function's dependencies."""
+    return '%s-dependencies' % function
+
+
+def get_layer_name_from_arn(arn):
+    """Return the name of a layer, from the ARN of one of its versions."""
+    # arn:aws:lambda:<region>:<account>:layer:<name>:<version>
+    return arn.split(':')[6]
+
+
+def get_layer_description(fingerprint):
+    return 'Lambkin dependency layer %s' % fingerprint
+
+
+def publish_layer_package(package, fingerprint, function, runtime,
+                          s3_bucket=None, s3_endpoint_url=None, lmbda=None):
+    """Publish a layer of dependencies from an open zip file.
+
+    A new layer version is only published when the fingerprint differs
+    from the latest version's. Returns the ARN of the layer version.
+    """
+    lmbda = lmbda or get_client('lambda')
+    layer_name = get_layer_name(function)
+    description = get_layer_description(fingerprint)
+
+    latest = lmbda.list_layer_versions(
+        LayerName=layer_name, MaxItems=1)['LayerVersions']
+    if latest and latest[0].get('Description') == description:
+        say('%s is already up to date in Lambda' % layer_name)
+        return latest[0]['LayerVersionArn']
+
+    response = lmbda.publish_layer_version(
+        LayerName=layer_name,
+        Description=description,
+        Content=get_code(package, layer_name, get_code_sha256(package),
+                         s3_bucket, s3_endpoint_url),
+        CompatibleRuntimes=[runtime])
+    say('%s version %d published in Lambda' % (layer_name, response['Version']))
+    return response['LayerVersionArn']
+
+
+def publish_dependency_layer(function, runtime, zip_options, s3_bucket=None,
+                             s3_endpoint_url=None):
+    """Package and publish the current function's dependencies as a layer.
+
+    Returns the list of layers the function should use, which is empty
+    when there are no dependencies.
+    """
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE) as package:
+        fingerprint = create_layer_zip(package, **zip_options)
+        if not fingerprint:
+            return []
+        return [publish_layer_package(package, fingerprint, function, runtime,
+                                      s3_bucket, s3_endpoint_url)]
@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+
+import socket
+import time
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from lambkin.aws import get_client
+from lambkin.report import aggregate_reports, get_percentile, parse_report
+
+THROTTLING_ERRORS = ('TooManyRequestsException', 'ThrottlingException')
+
+
+def read_payloads(payload_file):
+    """Return the events in a JSON Lines file, skipping blank lines."""
+    with open(payload_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def invoke_once(lmbda, function, payload, qualifier=None):
+    """Invoke a function, returning a dict describing what happened."""
+    from botocore.exceptions import BotoCoreError, ClientError
+    kwargs = {'FunctionName': function, 'LogType': 'Tail'}
+    if payload is not None:
+        kwargs['Payload'] = payload
+    if qualifier is not None:
+        kwargs['Qualifier'] = qualifier
+    start = time.time()
+    try:
+        result = lmbda.invoke(**kwargs)
+        result['Payload'].read()
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        return {
+            'status': 'throttled' if code in THROTTLING_ERRORS else 'error',
+            'latency': time.time() - start,
+        }
+    except (BotoCoreError, socket.error):
+        # Timeouts and dropped connections count as failed invocations,
+        # rather than ending the run.
+        return {'status': 'error', 'latency': time.time() - start}
+    report = parse_report(b64decode(result.get('LogResult', ''))) or {}
+    return {
+        'status': 'error' if 'FunctionError' in result else 'ok',
+        'latency': time.time() - start,
+        'cold_start': 'init_duration_ms' in report,
+        'report': report,
+    }
+
+
+def run_load_test(function, count, concurrency, payloads=None,
+                  qualifier=None, lmbda=None):
+    """Invoke a function count times, with up to concurrency in flight.
+
+    Payloads, if given, are used in turn. A qualifier (version or alias)
+    selects what to invoke. Returns a summary of the run.
+    """
+    lmbda = lmbda or get_client('lambda', retries={'max_attempts': 1},
+                                read_timeout=310,
+                                max_pool_connections=concurrency)
+    payloads = payloads or [None]
+
+    start = time.time()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = [executor.submit(invoke_once, lmbda, function,
+                                   payloads[i % len(payloads)], qualifier)
+                   for i in range(count)]
+        results = [future.result() for future in futures]
+    finally:
+        executor.shutdown()
+    elapsed = time.time() - start
+
+    return summarize(results, elapsed, concurrency)
+
+
+def summarize(results, elapsed, concurrency):
+    latencies = sorted(r['latency'] * 1000 for r in results
+                       if r['status'] == 'ok')
+    statuses = [r['status'] for r in results]
+    return {
+        'invocations': len(results),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(results) / elapsed, 3) if elapsed else None,
+        'errors': statuses.count('error'),
+        'throttles': statuses.count('throttled'),
+        'cold_starts': len([r for r in results if r.get('cold_start')]),
+        'latency_ms': {
+            'p50': get_percentile(latencies, 50),
+            'p90': get_percentile(latencies, 90),
+            'p99': get_percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        },
+        'metrics': aggregate_reports([r['report'] for r in results
+                                      if r.get('report')]),
+    }
@@ -0,0 +1,101 @@
+from __future__ import absolute_import
+
+import json
+import os
+import threading
+from click import ClickException
+from lambkin.ux import say
+from os.path import join
+from Queue import Queue
+from subprocess import Popen, PIPE
+
+WORKER_SCRIPT = join(os.path.dirname(os.path.abspath(__file__)),
+                     'local_worker.py')
+
+
+class LocalWorker(object):
+    """A warm process with a function's handler loaded, ready for events.
+
+    The worker runs under the function's virtualenv, so the handler sees
+    the same packages that it would in Lambda.
+    """
+
+    def __init__(self, function, memory, timeout,
+                 python=join('venv', 'bin', 'python')):
+        if not os.path.exists(python):
+            raise ClickException(
+                'No virtualenv found. Please run "lambkin build" first.')
+        self.function = function
+        self.process = Popen(
+            [python, WORKER_SCRIPT, function, str(memory), str(timeout)],
+            stdin=PIPE, stdout=PIPE)
+
+    def invoke(self, request_id, event):
+        """Send an event to the handler and return the worker's response."""
+        request = json.dumps({'id': request_id, 'event': event})
+        self.process.stdin.write(request + '\n')
+        self.process.stdin.flush()
+        response = self.process.stdout.readline()
+        if not response:
+            raise ClickException(
+                'The local worker for %s has died.' % self.function)
+        return json.loads(response)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def read_events(lines):
+    """Yield (id, event) for each non-blank line of JSON, as it arrives."""
+    request_id = 0
+    for line in iter(lines.readline, ''):
+        if line.strip():
+            request_id += 1
+            yield request_id, json.loads(line)
+
+
+def invoke_local(function, events, memory, timeout, workers, on_response):
+    """Invoke a handler locally for each (id, event), on warm workers.
+
+    Events are consumed as they arrive, so they can be streamed. Each
+    response is passed to on_response as soon as it is ready.
+    """
+    pool = [LocalWorker(function, memory, timeout) for _ in range(workers)]
+    queue = Queue(maxsize=workers * 2)
+    lock = threading.Lock()
+    errors = []
+
+    def serve(worker):
+        while True:
+            request = queue.get()
+            if request is None:
+                return
+            try:
+                response = worker.invoke(*request)
+            except Exception as e:
+                errors.append(e)
+                continue
+            with lock:
+                on_response(response)
+
+    threads = [threading.Thread(target=serve, args=(worker,))
+               for worker in pool]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        for request in events:
+            if errors:
+                break
+            queue.put(request)
+    finally:
+        for _ in threads:
+            queue.put(None)
+        for thread in threads:
+            thread.join()
+        for worker in pool:
+            worker.close()
+    if errors:
+        raise errors[0]
+    say('%s handled events on %d warm worker(s)' % (function, workers))
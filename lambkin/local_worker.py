@@ -0,0 +1,106 @@
+"""A warm worker process for "lambkin invoke-local".
+
+This script runs under the function's own virtualenv interpreter, so it
+must only use the standard library, and work on Python 2 and 3. It
+imports the handler once, then answers requests from stdin, one JSON
+object per line, for as long as it lives:
+
+    {"id": 1, "event": {...}}
+
+Each response is a line of JSON on the original stdout. Anything the
+handler prints goes to stderr instead.
+"""
+import importlib
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+import uuid
+
+
+class HandlerTimeout(Exception):
+    pass
+
+
+class Context(object):
+    """A stand-in for the context object that Lambda gives a handler."""
+
+    def __init__(self, function_name, memory_limit_in_mb, timeout):
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.invoked_function_arn = 'arn:aws:lambda:local:000000000000:function:%s' % function_name
+        self.memory_limit_in_mb = str(memory_limit_in_mb)
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = '/aws/lambda/%s' % function_name
+        self.log_stream_name = 'local'
+        self.identity = None
+        self.client_context = None
+        self._deadline = time.time() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+
+def on_timeout(signum, frame):
+    raise HandlerTimeout('Task timed out')
+
+
+def invoke(handler, request, function_name, memory, timeout):
+    context = Context(function_name, memory, timeout)
+    response = {'id': request['id'], 'request_id': context.aws_request_id}
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.time()
+    try:
+        response['result'] = handler(request['event'], context)
+    except Exception as e:
+        response['error'] = {
+            'errorType': e.__class__.__name__,
+            'errorMessage': str(e),
+            'stackTrace': traceback.format_exc().splitlines(),
+        }
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    response['duration_ms'] = round((time.time() - start) * 1000, 3)
+    # ru_maxrss is in KiB on Linux, but bytes on Mac OS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        max_rss //= 1024
+    response['max_memory_used_kb'] = max_rss
+    return response
+
+
+def main():
+    function_name, memory, timeout = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+    sys.path.insert(0, os.getcwd())
+
+    # Keep the protocol stream to ourselves.
+    protocol = sys.stdout
+    sys.stdout = sys.stderr
+
+    signal.signal(signal.SIGALRM, on_timeout)
+    start = time.time()
+    handler = importlib.import_module(function_name).handler
+    init_duration_ms = round((time.time() - start) * 1000, 3)
+
+    for line in iter(sys.stdin.readline, ''):
+        response = invoke(handler, json.loads(line), function_name, memory,
+                          timeout)
+        if init_duration_ms is not None:
+            response['init_duration_ms'] = init_duration_ms
+            init_duration_ms = None
+        try:
+            serialized = json.dumps(response)
+        except (TypeError, ValueError) as e:
+            del response['result']
+            response['error'] = {'errorType': 'SerializationError',
+                                 'errorMessage': str(e)}
+            serialized = json.dumps(response)
+        protocol.write(serialized + '\n')
+        protocol.flush()
+
+
+if __name__ == '__main__':
+    main()
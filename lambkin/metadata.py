@@ -1,49 +1,158 @@
+from __future__ import absolute_import
+
 import json
 import os
+import tempfile
+from contextlib import contextmanager
+from lambkin.instrument import count, span
 
 metadata_file = 'metadata.json'
 defaults = {
     'timeout': 60,
     'memory': 128,
-    'role': 'lambda_basic_execution'
+    'role': 'lambda_basic_execution',
+    's3_bucket': None,
+    'dependency_layer': False,
+    'slim': False,
+    'bytecode': 'none'
 }
 
 
-def get(key):
+# Directories that never contain functions, so aren't worth searching.
+skipped_dirs = ('venv', 'node_modules')
+
+# Parsed metadata files, by absolute path. Each entry records the mtime
+# and size of the file when it was read, and whether it holds updates
+# that batched_updates() hasn't written yet.
+_cache = {}
+_batch_depth = 0
+
+
+def get_path(directory=None):
+    """Return the path of the metadata.json in directory (default: here)."""
+    return os.path.abspath(os.path.join(directory or '.', metadata_file))
+
+
+def _get_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def get(key, directory=None):
     """Return a single named property from the metadata.
 
     Defaults are returned for some properties if they are not stored in
     the metadata.json file.
     """
     try:
-        return read()[key]
+        return read(directory)[key]
     except KeyError:
         return defaults[key]
 
 
-def read():
-    """Read metadata for a function from disk (metadata.json)."""
-    if os.path.exists(metadata_file):
-        with open(metadata_file) as f:
-            return json.load(f)
-    else:
+def read(directory=None):
+    """Read metadata for a function from disk (metadata.json).
+
+    The file is parsed once, and then served from memory until it changes
+    on disk.
+    """
+    path = get_path(directory)
+    entry = _cache.get(path)
+    if entry and (entry['dirty'] or entry['stamp'] == _get_stamp(path)):
+        return dict(entry['data'])
+
+    stamp = _get_stamp(path)
+    if stamp is None:
         return {}
+    with span('metadata.read'):
+        with open(path) as f:
+            data = json.load(f)
+    _cache[path] = {'data': data, 'stamp': stamp, 'dirty': False}
+    return dict(data)
+
+
+def _write_path(path, metadata):
+    """Atomically replace the file at path with metadata, as JSON.
+
+    The new file is written beside the old one and renamed into place, so
+    readers only ever see a complete file.
+    """
+    count('metadata.writes')
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metadata-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps(metadata, indent=4, sort_keys=True))
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except OSError:
+            os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    _cache[path] = {'data': dict(metadata), 'stamp': _get_stamp(path),
+                    'dirty': False}
 
 
 def write(subdirectory=None, **metadata):
     """Write keyword arguments, in JSON format, to metadata.json."""
-    if subdirectory:
-        path = os.path.join(subdirectory, metadata_file)
-    else:
-        path = metadata_file
-    with open(path, 'w') as f:
-        serialized = json.dumps(metadata, indent=4, sort_keys=True)
-        f.write(serialized)
+    _write_path(get_path(subdirectory), metadata)
 
 
 def update(**metadata):
-    """Update the metadata file with any given values."""
-    updated_metadata = read()
+    """Update the metadata file with any given values.
+
+    Inside batched_updates(), the file is written once, at the end.
+    """
+    current_metadata = read()
+    updated_metadata = dict(current_metadata)
     for k, v in metadata.iteritems():
         updated_metadata[k] = metadata[k]
-    write(**updated_metadata)
+    # Leave an unchanged file alone, so that its mtime (and therefore the
+    # content of the deployment zip) stays stable.
+    if updated_metadata == current_metadata:
+        return
+    if _batch_depth:
+        path = get_path()
+        _cache[path] = {'data': updated_metadata,
+                        'stamp': _get_stamp(path), 'dirty': True}
+    else:
+        write(**updated_metadata)
+
+
+def flush():
+    """Write any metadata held back by batched_updates()."""
+    for path, entry in _cache.items():
+        if entry['dirty']:
+            _write_path(path, entry['data'])
+
+
+@contextmanager
+def batched_updates():
+    """Collect the update() calls made in a block into one write per file."""
+    global _batch_depth
+    _batch_depth += 1
+    try:
+        yield
+    finally:
+        _batch_depth -= 1
+        if not _batch_depth:
+            flush()
+
+
+def find_function_dirs(root='.'):
+    """Return every directory under root that holds a metadata.json."""
+    function_dirs = []
+    for dirpath, dirs, files in os.walk(root):
+        if metadata_file in files:
+            function_dirs.append(dirpath)
+            # Functions don't nest, so there is nothing more to find here.
+            dirs[:] = []
+        else:
+            dirs[:] = [d for d in dirs
+                       if d not in skipped_dirs and not d.startswith('.')]
+    return sorted(function_dirs)
@@ -0,0 +1,43 @@
+from __future__ import absolute_import
+
+import multiprocessing
+import os
+import sys
+from lambkin.exceptions import get_error_message
+
+
+def run_in_pool(func, job_args, processes, chunksize=1, ordered=True):
+    """Yield func(args) for each of job_args, from a pool of processes.
+
+    Results come in the order of job_args, or as soon as each is ready
+    if ordered is False. The pool is shut down once the results have all
+    been taken, or when the generator is closed.
+    """
+    pool = multiprocessing.Pool(max(1, min(processes, len(job_args))))
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        results = imap(func, job_args, chunksize)
+        for _ in job_args:
+            # A timeout on next() keeps the pool interruptible with Ctrl-C.
+            yield results.next(sys.maxint)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def run_in_dir(directory, work, *args):
+    """Call work(result, *args) in directory. Runs in a worker process.
+
+    Returns the result dict, which has the "directory", whatever work()
+    put in it and, if work() failed, a "status" of "failed" and an
+    "error".
+    """
+    result = {'directory': directory}
+    try:
+        # Worker processes have a working directory of their own.
+        os.chdir(directory)
+        work(result, *args)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = get_error_message(e)
+    return result
@@ -0,0 +1,115 @@
+from __future__ import absolute_import
+
+from lambkin.aws import get_client, get_role_arn
+from lambkin.instrument import span
+from lambkin.layer import get_layer_name_from_arn
+from lambkin.upload import get_code
+from lambkin.ux import say
+from lambkin.zip import get_code_sha256
+import lambkin.function_index as function_index
+
+
+def get_configuration_changes(live, **desired):
+    """Return the subset of desired settings that differ from the live ones.
+
+    "live" is a function configuration, as returned by Lambda.
+    """
+    live = dict(live)
+    # Lambda leaves "Layers" out for a function that has none.
+    live['Layers'] = [layer['Arn'] for layer in live.get('Layers', [])]
+    return dict((k, v) for k, v in desired.iteritems() if live.get(k) != v)
+
+
+def wait_for_update(lmbda, function, waiter_name='function_updated'):
+    """Wait until an update to a function's code or configuration is done.
+
+    For a function that has only just been created, use the
+    "function_active" waiter instead.
+    """
+    try:
+        waiter = lmbda.get_waiter(waiter_name)
+    except ValueError:
+        # Older botocore has no such waiter, from when updates applied at
+        # once.
+        return
+    waiter.wait(FunctionName=function)
+
+
+def publish_package(package, function, runtime, description, role, timeout,
+                    memory, s3_bucket=None, s3_endpoint_url=None, lmbda=None,
+                    layers=None, dropped_layer=None):
+    """Create or update a function in Lambda from an open zip file.
+
+    If layers is a list of layer version ARNs, the function is set to use
+    exactly those layers. Otherwise, its layers are left alone, except that
+    any version of the layer named dropped_layer is taken off. Returns a
+    tuple of the action taken ("created", "updated" or "unchanged") and the
+    final response from Lambda.
+    """
+    lmbda = lmbda or get_client('lambda')
+    with span('publish.hash_package'):
+        code_sha256 = get_code_sha256(package)
+    with span('publish.get_role_arn'):
+        role_arn = get_role_arn(role)
+
+    def get_package_code():
+        return get_code(package, function, code_sha256, s3_bucket,
+                        s3_endpoint_url)
+
+    with span('publish.get_configuration'):
+        live = function_index.get_published_configuration(lmbda, function)
+    if live:
+        final_response = live
+
+        if live['CodeSha256'] != code_sha256:
+            # Push the latest code to the existing function in Lambda.
+            code = get_package_code()
+            with span('publish.update_code'):
+                final_response = lmbda.update_function_code(
+                    FunctionName=function,
+                    Publish=True,
+                    **code)
+
+        # Update any settings for the function that have changed.
+        settings = dict(Description=description, Role=role_arn,
+                        Timeout=timeout, MemorySize=memory)
+        if layers is not None:
+            settings['Layers'] = layers
+        elif dropped_layer:
+            settings['Layers'] = [
+                layer['Arn'] for layer in live.get('Layers', [])
+                if get_layer_name_from_arn(layer['Arn']) != dropped_layer]
+        changes = get_configuration_changes(live, **settings)
+        if changes:
+            if final_response is not live:
+                # Lambda refuses a configuration update while the code
+                # update is still in progress.
+                with span('publish.wait_for_update'):
+                    wait_for_update(lmbda, function)
+            with span('publish.update_configuration'):
+                final_response = lmbda.update_function_configuration(
+                    FunctionName=function, **changes)
+
+        if final_response is live:
+            action = 'unchanged'
+            say('%s is already up to date in Lambda' % function)
+        else:
+            action = 'updated'
+            say('%s updated in Lambda' % function)
+    else:  # we need to explictly create the function in AWS.
+        code = get_package_code()
+        with span('publish.create_function'):
+            final_response = lmbda.create_function(
+                FunctionName=function,
+                Description=description,
+                Runtime=runtime,
+                Role=role_arn,
+                Handler='%s.handler' % function,
+                Code=code,
+                Timeout=timeout,
+                MemorySize=memory,
+                Layers=layers or [])
+        function_index.invalidate(lmbda)
+        action = 'created'
+        say('%s created in Lambda' % function)
+    return action, final_response
@@ -0,0 +1,61 @@
+import math
+
+# REF: http://docs.aws.amazon.com/lambda/latest/dg/monitoring-functions-logs.html
+REPORT_FIELDS = {
+    'Duration': 'duration_ms',
+    'Billed Duration': 'billed_duration_ms',
+    'Memory Size': 'memory_size_mb',
+    'Max Memory Used': 'max_memory_used_mb',
+    'Init Duration': 'init_duration_ms',
+}
+
+
+def parse_report(log):
+    """Return the metrics from the REPORT lines of a Lambda log, as a dict.
+
+    eg.
+
+    parse_report("REPORT RequestId: 1f2e\\tDuration: 2.50 ms\\t...")
+    {"duration_ms": 2.5, ...}
+
+    Returns None if the log has no report.
+    """
+    metrics = {}
+    for line in log.splitlines():
+        if not line.startswith(('REPORT ', 'INIT_REPORT ')):
+            continue
+        # Drop the "REPORT" or "INIT_REPORT" token, so that the first
+        # field's name is just its name, like "Init Duration".
+        for field in line.split(' ', 1)[1].split('\t'):
+            name, _, value = field.partition(':')
+            if name.strip() in REPORT_FIELDS:
+                metrics[REPORT_FIELDS[name.strip()]] = \
+                    float(value.split()[0])
+    return metrics or None
+
+
+def get_percentile(sorted_values, percent):
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def aggregate_reports(reports):
+    """Summarize the metrics of many reports, one summary per metric."""
+    aggregate = {}
+    for metric in sorted(REPORT_FIELDS.values()):
+        values = sorted(r[metric] for r in reports if metric in r)
+        if not values:
+            continue
+        aggregate[metric] = {
+            'count': len(values),
+            'mean': round(sum(values) / len(values), 3),
+            'min': values[0],
+            'p50': get_percentile(values, 50),
+            'p90': get_percentile(values, 90),
+            'p99': get_percentile(values, 99),
+            'max': values[-1],
+        }
+    return aggregate
@@ -0,0 +1,306 @@
+from __future__ import absolute_import
+
+import json
+from click import ClickException
+from concurrent.futures import ThreadPoolExecutor
+from lambkin.aws import THROTTLED_MAX_ATTEMPTS, get_client
+from lambkin.aws import get_event_rule_arn, get_function_arn
+from lambkin.exceptions import get_error_message
+from lambkin.instrument import span
+
+# The most targets that EventBridge accepts in one PutTargets call.
+PUT_TARGETS_BATCH_SIZE = 10
+# ...and in one RemoveTargets call.
+REMOVE_TARGETS_BATCH_SIZE = 100
+
+
+def get_rule_name(function):
+    """Return the name of the rule that "lambkin schedule" makes."""
+    return 'lambkin-cron-%s' % function
+
+
+def get_statement_id(function, rule):
+    """Return the id of the permission that lets rule invoke function."""
+    if rule == get_rule_name(function):
+        return 'lambkin-allow-cloudwatch-invoke-%s' % function
+    return 'lambkin-allow-%s' % rule
+
+
+def get_target_function(target):
+    """Return the name of the function that a rule's target invokes."""
+    return target['Arn'].split(':function:', 1)[1]
+
+
+def get_schedule_expression(rate=None, cron=None):
+    if rate and cron:
+        raise ClickException(
+            'Please use either "rate" or "cron", not both.')
+    if rate:
+        return 'rate(%s)' % rate
+    elif cron:
+        return 'cron(%s)' % cron
+    raise ClickException('Please provide "rate" or "cron".')
+
+
+def read_manifest(manifest):
+    """Parse a schedule manifest from an open file, grouping it by rule.
+
+    The manifest is a JSON list of schedules (or an object with the list
+    under "schedules"), like:
+
+    [{"function": "report", "cron": "0 8 * * ? *"},
+     {"function": "poll-a", "rate": "5 minutes", "rule": "every-5-minutes"},
+     {"function": "poll-b", "rate": "5 minutes", "rule": "every-5-minutes",
+      "input": {"queue": "b"}}]
+
+    Schedules that name the same rule share it, and must agree on when it
+    fires. Otherwise, each function gets a rule of its own, named just as
+    "lambkin schedule --function" would name it.
+
+    Returns a dict of rule name to {"expression": ..., "targets": [...]}.
+    """
+    try:
+        schedules = json.load(manifest)
+    except ValueError as e:
+        raise ClickException('Bad schedule manifest: %s' % e)
+    if isinstance(schedules, dict):
+        schedules = schedules.get('schedules', [])
+
+    rules = {}
+    for entry in schedules:
+        if 'function' not in entry:
+            raise ClickException('Every schedule needs a "function".')
+        function = entry['function']
+        expression = get_schedule_expression(entry.get('rate'),
+                                             entry.get('cron'))
+        rule_name = entry.get('rule') or get_rule_name(function)
+        rule = rules.setdefault(rule_name, {'expression': expression,
+                                            'targets': []})
+        if rule['expression'] != expression:
+            raise ClickException(
+                'Schedules for rule "%s" disagree on when it runs.' %
+                rule_name)
+        target = {'Id': function, 'Arn': get_function_arn(function)}
+        if 'input' in entry:
+            target['Input'] = json.dumps(entry['input'], sort_keys=True)
+        if target['Id'] in [t['Id'] for t in rule['targets']]:
+            raise ClickException('%s is scheduled twice by rule "%s".' %
+                                 (function, rule_name))
+        rule['targets'].append(target)
+    return rules
+
+
+def get_live_rule(events, rule_name):
+    """Return a rule and its targets, or None if there's no such rule."""
+    from botocore.exceptions import ClientError
+    try:
+        rule = events.describe_rule(Name=rule_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return None
+        raise e
+    targets = []
+    kwargs = {'Rule': rule_name}
+    while True:
+        page = events.list_targets_by_rule(**kwargs)
+        targets.extend(page['Targets'])
+        if not page.get('NextToken'):
+            break
+        kwargs['NextToken'] = page['NextToken']
+    rule['Targets'] = targets
+    return rule
+
+
+def get_live_statements(lmbda, function):
+    """Return the function's permission statements, keyed by Sid."""
+    from botocore.exceptions import ClientError
+    try:
+        policy = lmbda.get_policy(FunctionName=function)['Policy']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return {}
+        raise e
+    return dict((s['Sid'], s) for s in json.loads(policy)['Statement'])
+
+
+def read_live_statements(lmbda, function):
+    """Return a function's statements, or the error that stopped them being
+    read, so that one missing function doesn't stop the others.
+    """
+    try:
+        return get_live_statements(lmbda, function)
+    except Exception as e:
+        return e
+
+
+def get_source_arn(statement):
+    try:
+        return statement['Condition']['ArnLike']['AWS:SourceArn']
+    except KeyError:
+        return None
+
+
+def plan_rule(rule_name, rule, live):
+    """Return the calls needed to make the live rule match the manifest."""
+    plan = {'rule': rule_name, 'created': live is None, 'put_rule': False,
+            'put_targets': [], 'remove_targets': []}
+    if live is None or live.get('ScheduleExpression') != rule['expression'] \
+       or live.get('State') != 'ENABLED':
+        plan['put_rule'] = True
+    live_targets = dict((t['Id'], t) for t in (live or {}).get('Targets', []))
+    for target in rule['targets']:
+        current = live_targets.pop(target['Id'], None)
+        if not current or current['Arn'] != target['Arn'] or \
+           current.get('Input') != target.get('Input'):
+            plan['put_targets'].append(target)
+    # The manifest is the whole truth about the rules it names.
+    plan['remove_targets'] = sorted(live_targets)
+    return plan
+
+
+def apply_rule_plan(events, plan, rule):
+    """Make the calls in a plan, in order, batching the targets."""
+    rule_name = plan['rule']
+    if plan['put_rule']:
+        with span('schedule.put_rule'):
+            events.put_rule(
+                Name=rule_name,
+                ScheduleExpression=rule['expression'],
+                State='ENABLED',
+                Description='Lambkin schedule for %s' % ', '.join(
+                    sorted(set(get_target_function(t)
+                               for t in rule['targets']))),
+            )
+    targets = plan['put_targets']
+    for i in range(0, len(targets), PUT_TARGETS_BATCH_SIZE):
+        with span('schedule.put_targets'):
+            response = events.put_targets(
+                Rule=rule_name,
+                Targets=targets[i:i + PUT_TARGETS_BATCH_SIZE])
+        if response.get('FailedEntryCount'):
+            raise ClickException('Could not add targets to %s: %s' % (
+                rule_name, json.dumps(response['FailedEntries'])))
+    ids = plan['remove_targets']
+    for i in range(0, len(ids), REMOVE_TARGETS_BATCH_SIZE):
+        with span('schedule.remove_targets'):
+            events.remove_targets(
+                Rule=rule_name, Ids=ids[i:i + REMOVE_TARGETS_BATCH_SIZE])
+
+
+def apply_permission(lmbda, function, rule_name, live_statements):
+    """Let a rule invoke a function, unless it already can.
+
+    Returns True if the function's policy had to be changed.
+    """
+    statement_id = get_statement_id(function, rule_name)
+    source_arn = get_event_rule_arn(rule_name)
+    live = live_statements.get(statement_id)
+    if live and get_source_arn(live) == source_arn:
+        return False
+    if live:
+        lmbda.remove_permission(FunctionName=function,
+                                StatementId=statement_id)
+    with span('schedule.add_permission'):
+        lmbda.add_permission(
+            FunctionName=function,
+            StatementId=statement_id,
+            Action='lambda:InvokeFunction',
+            Principal='events.amazonaws.com',
+            SourceArn=source_arn,
+        )
+    return True
+
+
+def apply_permissions(lmbda, function, rule_names, live_statements):
+    """Let several rules invoke a function, one at a time.
+
+    Lambda rejects concurrent changes to one function's policy, so each
+    function's permissions are changed in turn. Returns a dict of rule
+    name to True if its permission had to be added, False if it was
+    already there, or the error that stopped it being added.
+    """
+    if isinstance(live_statements, Exception):
+        # The function's policy couldn't even be read.
+        return dict((rule_name, live_statements) for rule_name in rule_names)
+    outcomes = {}
+    for rule_name in rule_names:
+        try:
+            outcomes[rule_name] = apply_permission(lmbda, function, rule_name,
+                                                   live_statements)
+        except Exception as e:
+            outcomes[rule_name] = e
+    return outcomes
+
+
+def apply_manifest(rules, concurrency=8):
+    """Bring the live schedules in line with rules, from read_manifest().
+
+    A rule may have several targets that invoke the same function, as
+    long as their Ids differ. Everything is read first, so unchanged
+    schedules cost only reads. Then the changes are made, concurrently.
+    Returns a summary of what was done to each rule. A rule that couldn't
+    be brought in line gets a status of "failed", and an "error".
+    """
+    lmbda = get_client('lambda', max_pool_connections=concurrency,
+                       retries={'max_attempts': THROTTLED_MAX_ATTEMPTS})
+    events = get_client('events', max_pool_connections=concurrency,
+                        retries={'max_attempts': THROTTLED_MAX_ATTEMPTS})
+    rule_names = sorted(rules)
+    grants = {}
+    for name in rule_names:
+        for target in rules[name]['targets']:
+            grants.setdefault(get_target_function(target), set()).add(name)
+    functions = sorted(grants)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        with span('schedule.read', rules=len(rule_names),
+                  functions=len(functions)):
+            live_rules = executor.map(
+                lambda name: get_live_rule(events, name), rule_names)
+            live_statements = executor.map(
+                lambda function: read_live_statements(lmbda, function),
+                functions)
+            plans = [plan_rule(name, rules[name], live)
+                     for name, live in zip(rule_names, live_rules)]
+            live_statements = dict(zip(functions, live_statements))
+
+        permission_futures = dict(
+            (function, executor.submit(
+                apply_permissions, lmbda, function, sorted(grants[function]),
+                live_statements[function]))
+            for function in functions)
+        rule_futures = [
+            executor.submit(apply_rule_plan, events, plan, rules[plan['rule']])
+            for plan in plans]
+
+        results = []
+        for plan, future in zip(plans, rule_futures):
+            outcomes = [(function, f.result()[plan['rule']])
+                        for function, f in sorted(permission_futures.items())
+                        if plan['rule'] in grants[function]]
+            errors = [get_error_message(outcome)
+                      for function, outcome in outcomes
+                      if isinstance(outcome, Exception)]
+            if future.exception():
+                errors.insert(0, get_error_message(future.exception()))
+            if errors:
+                results.append({'rule': plan['rule'], 'status': 'failed',
+                                'error': '; '.join(errors)})
+                continue
+            granted = [function for function, outcome in outcomes if outcome]
+            if plan['created']:
+                status = 'created'
+            elif plan['put_rule'] or plan['put_targets'] or \
+                    plan['remove_targets'] or granted:
+                status = 'updated'
+            else:
+                status = 'unchanged'
+            results.append({
+                'rule': plan['rule'],
+                'status': status,
+                'rule_updated': plan['put_rule'],
+                'targets_put': [t['Id'] for t in plan['put_targets']],
+                'targets_removed': plan['remove_targets'],
+                'permissions_added': granted,
+            })
+    return results
@@ -1,4 +1,3 @@
-import pystache
 from os.path import join
 from textwrap import dedent
 
@@ -10,6 +9,7 @@ def render_template(template_name, function_name, output_filename=None):
     expansions = {
         'function_name': function_name
     }
+    import pystache
     with open(output, 'w') as dst:
         dst.write(pystache.render(templates[template_name], expansions))
 
@@ -32,9 +32,16 @@ templates = {
         # get commited. In fact, almost everything is ignored, so if you want to add
         # and commit more than just your script, you'll need to explicitly list things
         # in "functions/{{function_name}}/.gitignore".
-        #
-        #
-        #
+
+        import time
+
+
+        # "lambkin keep-warm" pings this function regularly, so that it rarely
+        # starts cold. This spots the pings.
+        def is_warmup(event):
+            return isinstance(event, dict) and 'lambkin-warmup' in event
+
+
         # Here is the entry point for Lambda. Execution starts here when an
         # event triggers us to run.
         #
@@ -42,6 +49,14 @@ templates = {
         # object for this execution.
 
         def handler(event, context):
+            if is_warmup(event):
+                # Linger a moment when several pings are sent at once, so that
+                # each one lands on an instance of its own. Then skip the real
+                # work.
+                if event['lambkin-warmup'].get('concurrency', 1) > 1:
+                    time.sleep(0.1)
+                return 'warm'
+
             # To log to Cloudwatch, just:
             print "anything you like."
 
@@ -63,7 +78,19 @@ templates = {
         """
         // {{function_name}}.js: An AWS Lambda function.
 
+        // Return true for the pings sent by "lambkin keep-warm".
+        function isWarmup(event) {
+          return Boolean(event && event["lambkin-warmup"]);
+        }
+
         exports.handler = function(event, context, callback) {
+          if (isWarmup(event)) {
+            // Linger a moment when several pings are sent at once, so that each
+            // one lands on an instance of its own. Then skip the real work.
+            var linger = event["lambkin-warmup"].concurrency > 1 ? 100 : 0;
+            return setTimeout(function() { callback(null, "warm"); }, linger);
+          }
+
           console.log("Running in Lambda...");
 
           // An abitrary object.
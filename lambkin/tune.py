@@ -0,0 +1,113 @@
+from __future__ import absolute_import
+
+from concurrent.futures import ThreadPoolExecutor
+from lambkin.loadtest import run_load_test
+from lambkin.publish import wait_for_update
+from lambkin.ux import say
+
+DEFAULT_MEMORY_SIZES = (128, 256, 512, 1024, 1536)
+
+# REF: https://aws.amazon.com/lambda/pricing/
+GB_SECOND_PRICE = 0.0000166667
+REQUEST_PRICE = 0.0000002
+
+
+def get_invocation_cost(billed_duration_ms, memory_mb):
+    """Return the price, in USD, of one invocation."""
+    gb_seconds = (billed_duration_ms / 1000.0) * (memory_mb / 1024.0)
+    return gb_seconds * GB_SECOND_PRICE + REQUEST_PRICE
+
+
+def list_version_numbers(lmbda, function):
+    versions = set()
+    paginator = lmbda.get_paginator('list_versions_by_function')
+    for page in paginator.paginate(FunctionName=function):
+        versions.update(v['Version'] for v in page['Versions'])
+    return versions
+
+
+def publish_memory_versions(lmbda, function, memory_sizes):
+    """Publish a version of a function for each memory size.
+
+    The function's own memory setting is restored afterwards. Returns a
+    dict of memory size to version, and the set of versions that were
+    newly created (and so are safe to delete). If anything fails, the
+    versions created so far are deleted.
+    """
+    original_memory = lmbda.get_function_configuration(
+        FunctionName=function)['MemorySize']
+    existing_versions = list_version_numbers(lmbda, function)
+    versions = {}
+    try:
+        for memory in memory_sizes:
+            lmbda.update_function_configuration(FunctionName=function,
+                                                MemorySize=memory)
+            wait_for_update(lmbda, function)
+            versions[memory] = lmbda.publish_version(
+                FunctionName=function,
+                Description='Lambkin tuning at %d MiB' % memory)['Version']
+            say('Published %s version %s with %d MiB' %
+                (function, versions[memory], memory))
+    except Exception:
+        delete_versions(lmbda, function,
+                        set(versions.values()) - existing_versions)
+        raise
+    finally:
+        lmbda.update_function_configuration(FunctionName=function,
+                                            MemorySize=original_memory)
+    return versions, set(versions.values()) - existing_versions
+
+
+def delete_versions(lmbda, function, versions):
+    for version in versions:
+        lmbda.delete_function(FunctionName=function, Qualifier=version)
+
+
+def summarize_memory_size(memory, version, summary):
+    metrics = summary['metrics']
+    result = {
+        'memory': memory,
+        'version': version,
+        'invocations': summary['invocations'],
+        'errors': summary['errors'] + summary['throttles'],
+        'duration_ms': None,
+        'billed_duration_ms': None,
+        'cost_per_invocation': None,
+    }
+    if 'duration_ms' in metrics:
+        result['duration_ms'] = metrics['duration_ms']['mean']
+        result['billed_duration_ms'] = metrics['billed_duration_ms']['mean']
+        result['cost_per_invocation'] = get_invocation_cost(
+            result['billed_duration_ms'], memory)
+    return result
+
+
+def tune_function(lmbda, function, memory_sizes, count, concurrency,
+                  payloads=None):
+    """Measure a function at several memory sizes, all at the same time.
+
+    Returns a list of results, one per memory size.
+    """
+    versions, created_versions = publish_memory_versions(
+        lmbda, function, memory_sizes)
+    executor = ThreadPoolExecutor(max_workers=len(versions))
+    try:
+        futures = dict(
+            (memory, executor.submit(run_load_test, function, count,
+                                     concurrency, payloads, version, lmbda))
+            for memory, version in versions.iteritems())
+        return [summarize_memory_size(memory, versions[memory],
+                                      futures[memory].result())
+                for memory in sorted(futures)]
+    finally:
+        executor.shutdown()
+        delete_versions(lmbda, function, created_versions)
+
+
+def recommend(results, strategy='cost'):
+    """Pick the cheapest ("cost") or fastest ("speed") error-free result."""
+    key = 'cost_per_invocation' if strategy == 'cost' else 'duration_ms'
+    candidates = [r for r in results if not r['errors'] and r[key] is not None]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda r: (r[key], r['memory']))
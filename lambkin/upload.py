@@ -0,0 +1,86 @@
+from __future__ import absolute_import
+
+import os
+from base64 import b64decode
+from click import ClickException
+from lambkin.aws import get_client
+from lambkin.instrument import count, span
+from lambkin.ux import say
+
+# Lambda refuses zip files larger than this when they are sent inline.
+# REF: http://docs.aws.amazon.com/lambda/latest/dg/limits.html
+DIRECT_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+# Packages smaller than this are built in memory.
+SPOOL_SIZE = 64 * 1024 * 1024
+
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def get_package_size(package):
+    """Return the size in bytes of an open package file."""
+    package.seek(0, os.SEEK_END)
+    return package.tell()
+
+
+class UnclosableFile(object):
+    """Wrap an open file, so that close() leaves it open.
+
+    upload_fileobj() closes small files once they are uploaded, but the
+    package is still needed afterwards.
+    """
+
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def close(self):
+        pass
+
+
+def get_s3_key(function, code_sha256):
+    """Return a content-addressed S3 key for a function's package."""
+    return 'lambkin/%s/%s.zip' % (function, b64decode(code_sha256).encode('hex'))
+
+
+def stage_in_s3(package, bucket, key, endpoint_url=None, concurrency=10):
+    """Upload a package to S3, in parallel parts, and return its location."""
+    from boto3.s3.transfer import TransferConfig
+    s3 = get_client('s3', endpoint_url=endpoint_url)
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_CHUNK_SIZE,
+        multipart_chunksize=MULTIPART_CHUNK_SIZE,
+        max_concurrency=concurrency)
+    size = get_package_size(package)
+    package.seek(0)
+    with span('upload.s3'):
+        s3.upload_fileobj(UnclosableFile(package), bucket, key,
+                          Config=transfer_config)
+    count('upload.bytes', size)
+    say('Staged package at s3://%s/%s' % (bucket, key))
+    return {'S3Bucket': bucket, 'S3Key': key}
+
+
+def get_code(package, function, code_sha256, s3_bucket=None,
+             s3_endpoint_url=None):
+    """Return the "Code" for a package, as create_function expects it.
+
+    The same keys work as arguments to update_function_code. Packages go
+    via S3 when a bucket is given, and inline otherwise.
+    """
+    if s3_bucket:
+        return stage_in_s3(package, s3_bucket,
+                           get_s3_key(function, code_sha256),
+                           endpoint_url=s3_endpoint_url)
+
+    size = get_package_size(package)
+    if size > DIRECT_UPLOAD_LIMIT:
+        raise ClickException(
+            'The package is %d MiB, which is too big to upload directly. '
+            'Please provide a bucket to stage it in with "--s3-bucket".' %
+            (size // (1024 * 1024)))
+    package.seek(0)
+    count('upload.bytes', size)
+    return {'ZipFile': package.read()}
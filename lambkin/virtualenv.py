@@ -1,26 +1,195 @@
+from __future__ import absolute_import
+
+import errno
+import hashlib
 import os
+import pipes
+import shutil
+import sys
+import tempfile
 from click import ClickException
-from subprocess import call, check_output
+from distutils.spawn import find_executable
+from lambkin.cache import get_cache_dir
+from lambkin.instrument import span
+from subprocess import check_output, CalledProcessError, STDOUT
 from os.path import join
 
+fingerprint_file = join('venv', '.lambkin-fingerprint')
+
+# Written into each cached base virtualenv, holding the path that it was
+# created at. Clones have that path replaced with their own.
+base_marker_file = '.lambkin-base'
+
 
 def have_virtualenv():
+    return find_executable('virtualenv') is not None
+
+
+def get_base_virtualenv_key(python):
+    """Return a key for the base virtualenv that suits an interpreter.
+
+    It changes whenever the interpreter or virtualenv itself is replaced.
+    """
+    key = hashlib.sha1()
+    for executable in (python, 'virtualenv'):
+        path = os.path.realpath(find_executable(executable) or executable)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        key.update('%s %s\n' % (path, mtime))
+    return key.hexdigest()
+
+
+def get_base_virtualenv(python='python2.7'):
+    """Return a pristine virtualenv for python, from the cache.
+
+    It is created the first time it's needed. Later, it is only ever
+    cloned by clone_virtualenv(), never used directly.
+    """
+    base_dir = join(get_cache_dir('virtualenvs'),
+                    get_base_virtualenv_key(python))
+    if os.path.exists(join(base_dir, base_marker_file)):
+        return base_dir
+    # Without a marker, it's the wreckage of something else.
+    shutil.rmtree(base_dir, ignore_errors=True)
+
+    # Build it beside its final place, so that another lambkin doing the
+    # same thing never sees a half-made environment.
+    build_dir = tempfile.mkdtemp(prefix='.building-',
+                                 dir=os.path.dirname(base_dir))
     try:
-        with open(os.devnull, 'w') as null:
-            status = call(['virtualenv', '--help'], stdout=null, stderr=null)
-        return status is 0
-    except OSError:
-        return False
+        with span('virtualenv.create'):
+            check_output(['virtualenv', '--python=%s' % python, build_dir])
+        with open(join(build_dir, base_marker_file), 'w') as f:
+            f.write(build_dir)
+        try:
+            os.rename(build_dir, base_dir)
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return base_dir
+
+
+def clone_virtualenv(base_dir, venv_dir):
+    """Make a new virtualenv at venv_dir, as a copy of a base virtualenv.
 
+    Files are hard linked, where possible, so a clone takes next to no
+    time or space. Scripts in bin/ mention the base's path, so they get
+    real copies, with the path replaced. Compiled files aren't copied at
+    all: Python writes its own, and they would name the wrong sources.
+    """
+    with open(join(base_dir, base_marker_file)) as f:
+        origin = f.read()
+    venv_dir = os.path.abspath(venv_dir)
+    if isinstance(venv_dir, unicode):
+        venv_dir = venv_dir.encode(sys.getfilesystemencoding())
+    bin_dir = join(base_dir, 'bin')
+    for root, dirs, files in os.walk(base_dir):
+        target_root = venv_dir + root[len(base_dir):]
+        os.mkdir(target_root)
+        for name in dirs + files:
+            src = join(root, name)
+            dst = join(target_root, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src).replace(origin, venv_dir), dst)
+            elif name in dirs or name == base_marker_file or \
+                    name.endswith(('.pyc', '.pyo')):
+                continue
+            elif root == bin_dir:
+                with open(src, 'rb') as f:
+                    content = f.read()
+                with open(dst, 'wb') as f:
+                    f.write(content.replace(origin, venv_dir))
+                shutil.copymode(src, dst)
+            else:
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+        dirs[:] = [d for d in dirs if not os.path.islink(join(root, d))]
 
-def create_virtualenv(function_name):
+
+def create_virtualenv(function_name, use_cache=True):
+    """Create the virtualenv for a function, in function_name/venv.
+
+    With use_cache, the virtualenv is cloned from a cached base, instead
+    of being built from scratch.
+    """
     if not have_virtualenv():
         raise ClickException('Lambkin needs virtualenv. Please install it.')
-    check_output([
-        'virtualenv', '--python=python2.7', join(function_name, 'venv')
-    ])
+    venv_dir = join(function_name, 'venv')
+    if use_cache:
+        base_dir = get_base_virtualenv()
+        with span('virtualenv.clone'):
+            clone_virtualenv(base_dir, venv_dir)
+        return
+    with span('virtualenv.create'):
+        check_output([
+            'virtualenv', '--python=python2.7', venv_dir
+        ])
 
 
-def run_in_virtualenv(command):
+def run_in_virtualenv(command, **kwargs):
     """Run a shell command with the current function's virtualenv active."""
-    return check_output('. venv/bin/activate && %s' % command, shell=True)
+    return check_output('. venv/bin/activate && %s' % command, shell=True,
+                        **kwargs)
+
+
+def get_dependency_fingerprint():
+    """Return a digest of everything that decides what pip would install.
+
+    That is the requirements file and the virtualenv's interpreter.
+    """
+    fingerprint = hashlib.sha256()
+    with open('requirements.txt', 'rb') as f:
+        fingerprint.update(f.read())
+    fingerprint.update(check_output([
+        join('venv', 'bin', 'python'), '-c',
+        'import sys; print(sys.executable); print(sys.version)'
+    ]))
+    return fingerprint.hexdigest()
+
+
+def read_fingerprint():
+    """Return the fingerprint of the last successful install, if any."""
+    try:
+        with open(fingerprint_file) as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def write_fingerprint(fingerprint):
+    with open(fingerprint_file, 'w') as f:
+        f.write(fingerprint)
+
+
+def install_requirements(use_wheel_cache=False):
+    """Install requirements.txt into the current function's virtualenv.
+
+    With use_wheel_cache, packages come from a local wheel cache that is
+    shared by all functions. Only wheels missing from the cache are built
+    or downloaded, so most installs never touch the package index.
+    """
+    with span('pip.install', wheel_cache=use_wheel_cache):
+        return _install_requirements(use_wheel_cache)
+
+
+def _install_requirements(use_wheel_cache):
+    if not use_wheel_cache:
+        return run_in_virtualenv('pip install -r requirements.txt')
+
+    # The cache dir may have spaces in it (from XDG_CACHE_HOME, say).
+    wheel_dir = pipes.quote(get_cache_dir('wheels'))
+    offline_install = ('pip install --no-index --find-links=%s '
+                       '-r requirements.txt' % wheel_dir)
+    try:
+        return run_in_virtualenv(offline_install, stderr=STDOUT)
+    except CalledProcessError:
+        # Some wheels are missing, so fetch or build them into the cache.
+        run_in_virtualenv('pip wheel --wheel-dir=%s --find-links=%s '
+                          '-r requirements.txt' % (wheel_dir, wheel_dir))
+        return run_in_virtualenv(offline_install)
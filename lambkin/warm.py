@@ -0,0 +1,133 @@
+from __future__ import absolute_import
+
+import hashlib
+import json
+import re
+from click import ClickException
+from lambkin.aws import get_client, get_function_arn
+from lambkin.instrument import span
+from lambkin.schedules import apply_manifest, get_statement_id
+
+# The key that marks an event as a ping from "lambkin keep-warm". The
+# handlers in lambkin.template look for it, so the two must agree.
+WARMUP_KEY = 'lambkin-warmup'
+
+# The most targets that EventBridge allows on one rule, by default. Each
+# target is one concurrent ping, so bigger warmers use more rules.
+RULE_TARGETS_LIMIT = 5
+
+# EventBridge rule names can be no longer than this. The name of a
+# function's first warming rule is kept short enough to leave room for a
+# suffix like ".12" on its extra rules.
+RULE_NAME_LIMIT = 64
+RULE_SUFFIX_ROOM = 5
+
+UNITS = {'m': 'minute', 'h': 'hour', 'd': 'day'}
+
+
+def get_rate(every):
+    """Turn an interval like "5m", "1h" or "2 days" into a rate() expression."""
+    match = re.match(r'^\s*(\d+)\s*(m|min|minutes?|h|hours?|d|days?)\s*$',
+                     every)
+    if not match or int(match.group(1)) < 1:
+        raise ClickException(
+            'Bad interval "%s". Try something like "5m", "1h" or "1d".' %
+            every)
+    value = int(match.group(1))
+    unit = UNITS[match.group(2)[0]]
+    return 'rate(%d %s%s)' % (value, unit, '' if value == 1 else 's')
+
+
+def get_warm_rule_name(function, index=0):
+    """Return the name of one of the rules that keep a function warm.
+
+    Function names can't hold dots, so the names of one function's extra
+    rules never clash with another function's. Names that would be too
+    long are truncated, and made unique again with a hash of the function
+    name.
+    """
+    base_name = 'lambkin-warm-%s' % function
+    limit = RULE_NAME_LIMIT - RULE_SUFFIX_ROOM
+    if len(base_name) > limit:
+        digest = hashlib.sha1(function).hexdigest()[:8]
+        base_name = '%s-%s' % (base_name[:limit - len(digest) - 1], digest)
+    if index == 0:
+        return base_name
+    return '%s.%d' % (base_name, index)
+
+
+def get_warm_rules(function, concurrency, every):
+    """Return rules, as read_manifest() would, that ping function
+    concurrency times at once, every so often.
+    """
+    expression = get_rate(every)
+    rules = {}
+    for i in range(concurrency):
+        rule_name = get_warm_rule_name(function, i // RULE_TARGETS_LIMIT)
+        rule = rules.setdefault(rule_name, {'expression': expression,
+                                            'targets': []})
+        rule['targets'].append({
+            # Ids only need to be unique within the rule. The function is
+            # named by the ARN, so the Id stays short whatever its name.
+            'Id': 'warm-%d' % i,
+            'Arn': get_function_arn(function),
+            'Input': json.dumps(
+                {WARMUP_KEY: {'index': i, 'concurrency': concurrency}},
+                sort_keys=True),
+        })
+    return rules
+
+
+def get_live_warm_rule_names(events, function):
+    """Return the names of the rules now keeping a function warm."""
+    # The prefix also matches the rules of functions whose names merely
+    # start with this one's, like "api-v2" for "api".
+    base_name = get_warm_rule_name(function)
+    names = []
+    kwargs = {'NamePrefix': base_name}
+    while True:
+        page = events.list_rules(**kwargs)
+        names.extend(rule['Name'] for rule in page['Rules']
+                     if rule['Name'] == base_name or
+                     rule['Name'].startswith(base_name + '.'))
+        if not page.get('NextToken'):
+            break
+        kwargs['NextToken'] = page['NextToken']
+    return sorted(names)
+
+
+def remove_warm_rule(events, lmbda, function, rule_name):
+    """Delete a warming rule, with its targets and its permission."""
+    from botocore.exceptions import ClientError
+    targets = events.list_targets_by_rule(Rule=rule_name)['Targets']
+    if targets:
+        with span('schedule.remove_targets'):
+            events.remove_targets(Rule=rule_name,
+                                  Ids=[t['Id'] for t in targets])
+    with span('schedule.delete_rule'):
+        events.delete_rule(Name=rule_name)
+    try:
+        lmbda.remove_permission(
+            FunctionName=function,
+            StatementId=get_statement_id(function, rule_name))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFoundException':
+            raise e
+
+
+def keep_warm(function, concurrency, every, apply_concurrency=8):
+    """Make sure a function is pinged concurrency times at once, every so
+    often, or not at all if concurrency is 0.
+
+    Rules that are no longer needed (say, after lowering concurrency) are
+    deleted. Returns a summary of what was done to each rule.
+    """
+    rules = get_warm_rules(function, concurrency, every)
+    results = apply_manifest(rules, apply_concurrency) if rules else []
+    events = get_client('events')
+    lmbda = get_client('lambda')
+    for rule_name in get_live_warm_rule_names(events, function):
+        if rule_name not in rules:
+            remove_warm_rule(events, lmbda, function, rule_name)
+            results.append({'rule': rule_name, 'status': 'removed'})
+    return sorted(results, key=lambda r: r['rule'])
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+
+import os
+import time
+import lambkin.metadata as metadata
+from lambkin.ignore import get_ignore_rules
+from lambkin.zip import walk_tree
+
+# Seconds between looks at the filesystem.
+POLL_INTERVAL = 0.5
+# Seconds that files must be left alone before a burst of edits is over.
+DEBOUNCE = 0.3
+
+
+def get_snapshot():
+    """Return the size and mtime of each of the function's own files.
+
+    Only the files that would go into the package are looked at, so the
+    virtualenv and anything in .lambkinignore cost nothing to watch.
+    """
+    rules = get_ignore_rules(slim=metadata.get('slim'))
+    snapshot = {}
+    for path in walk_tree('.', rules, skipped=('venv',)):
+        try:
+            st = os.stat(path)
+        except OSError:
+            # Deleted while we were looking. The next poll will notice.
+            continue
+        snapshot[path] = (st.st_mtime, st.st_size)
+    return snapshot
+
+
+def get_changed_paths(old, new):
+    """Return the paths that were added, removed or modified."""
+    return set(path for path in set(old) | set(new)
+               if old.get(path) != new.get(path))
+
+
+def wait_for_changes(snapshot, interval=POLL_INTERVAL, debounce=DEBOUNCE):
+    """Block until the function's files change, then settle down.
+
+    Editors often save in bursts (a temporary file, a rename, a backup),
+    so once something changes, wait until nothing has changed for
+    debounce seconds. Returns the new snapshot and the changed paths.
+    """
+    while True:
+        time.sleep(interval)
+        latest = get_snapshot()
+        if latest != snapshot:
+            break
+    while True:
+        time.sleep(debounce)
+        settled = get_snapshot()
+        if settled == latest:
+            return settled, get_changed_paths(snapshot, settled)
+        latest = settled
@@ -1,40 +1,269 @@
 from __future__ import absolute_import
 
+import hashlib
 import os
+import shutil
+import stat
+import tempfile
+import time
 import zipfile
 import lambkin.metadata as metadata
+from base64 import b64encode
+from lambkin.bytecode import add_bytecode
+from lambkin.ignore import get_ignore_rules
+from lambkin.instrument import count, span
+from lambkin.pool import run_in_pool
+from lambkin.zipcache import ZipCache, CHUNK_SIZE, COMPRESSION_LEVELS
+from lambkin.zipcache import compress_to_blob, get_blob_path
 
 # REF: http://docs.aws.amazon.com/lambda/latest/dg/lambda-python-how-to-create-deployment-package.html
 
+# The timestamp of every file in a reproducible zip. It's the earliest one
+# that zip files can hold.
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
 
-def create_zip(zip_file_path):
-    if not zip_file_path:
-        function = metadata.get('function')
-        zip_file_path = '/tmp/lambkin-publish-%s.zip' % function
 
-    zip_file = zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED)
+def walk_tree(top, rules, ignored=None, skipped=()):
+    """Yield the path of every file below top that the rules don't ignore.
 
-    for root, dirs, files in os.walk('.'):
-        site_dir = os.path.join('.', 'venv', 'lib', 'python2.7', 'site-packages')
-        dist_dir = os.path.join('.', 'venv', 'lib', 'python2.7', 'dist-packages')
+    Ignored directories are pruned before they are entered, so nothing
+    inside them is ever listed or stat()ed. Ignored paths are appended to
+    the list "ignored", if one is given. Directories in "skipped" (relative
+    to top) are pruned too, without counting as ignored.
+    """
+    for root, dirs, files in os.walk(top):
+        relative_root = root[len(top) + 1:]
+        kept_dirs = []
+        for d in dirs:
+            relative_dir = os.path.join(relative_root, d)
+            if relative_dir in skipped:
+                continue
+            if rules.ignores(relative_dir, is_dir=True):
+                if ignored is not None:
+                    ignored.append(os.path.join(root, d))
+            else:
+                kept_dirs.append(d)
+        dirs[:] = kept_dirs
         for f in files:
             path = os.path.join(root, f)
-            if path.endswith('.pyc'):
-                pass
-            elif root.startswith(site_dir):
-                # Then strip the library dir, and put the file in the zip.
-                trimmed_path = path[len(site_dir):]
-                zip_file.write(path, trimmed_path)
-            elif root.startswith(dist_dir):
-                # Then strip the library dir, and put the file in the zip.
-                trimmed_path = path[len(dist_dir):]
-                zip_file.write(path, trimmed_path)
-            elif root.startswith('./venv') or root.startswith('./.git'):
-                # Then it's other junk that we don't want.
-                pass
+            if rules.ignores(os.path.join(relative_root, f)):
+                if ignored is not None:
+                    ignored.append(path)
             else:
-                # Not sure what this is. The function author probably put
-                # it here for a reason, so make sure it goes in the zip.
-                zip_file.write(path, path)
-    zip_file.close()
+                yield path
+
+
+def get_package_files(code=True, dependencies=True, rules=None,
+                      ignored=None):
+    """Yield (path, arcname) for every file that belongs in the zip.
+
+    Either the function's own code or its dependencies (the packages in
+    its virtualenv) can be left out. Files that match the ignore rules
+    (by default, the presets and the function's .lambkinignore) are
+    always left out.
+    """
+    if rules is None:
+        rules = get_ignore_rules(slim=metadata.get('slim'))
+    if code:
+        # The packages in the virtualenv are handled separately, below. The
+        # rest of it is junk that we don't want.
+        for path in walk_tree('.', rules, ignored, skipped=('venv',)):
+            yield path, path
+    if dependencies:
+        for lib_dir in ('site-packages', 'dist-packages'):
+            site_dir = os.path.join('.', 'venv', 'lib', 'python2.7', lib_dir)
+            # Strip the library dir, and put the file in the zip.
+            for path in walk_tree(site_dir, rules, ignored):
+                yield path, path[len(site_dir):]
+
+
+def get_zip_name(arcname):
+    """Normalize an arcname, the same way ZipFile.write() does."""
+    arcname = os.path.normpath(os.path.splitdrive(arcname)[1])
+    while arcname[0] in (os.sep, os.altsep):
+        arcname = arcname[1:]
+    return arcname
+
+
+def get_date_time(st, reproducible=False):
+    """Return the timestamp that a file with stat result st gets in a zip."""
+    if reproducible:
+        return REPRODUCIBLE_DATE_TIME
+    return time.localtime(st.st_mtime)[0:6]
+
+
+def make_zip_info(path, arcname, reproducible=False):
+    """Build a ZipInfo for a file, the same way ZipFile.write() does.
+
+    A reproducible ZipInfo doesn't depend on when, where or by whom the
+    file was written. It gets a fixed timestamp, and a mode of 644, or
+    755 for executables.
+    """
+    st = os.stat(path)
+    if reproducible:
+        mode = stat.S_IFREG | (0o755 if st.st_mode & 0o111 else 0o644)
+    else:
+        mode = st.st_mode
+    zinfo = zipfile.ZipInfo(get_zip_name(arcname),
+                            get_date_time(st, reproducible))
+    zinfo.external_attr = (mode & 0xFFFF) << 16
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    if reproducible:
+        # Unix, wherever the zip was built, since the mode is a Unix one.
+        zinfo.create_system = 3
+    return zinfo
+
+
+def write_compressed(zip_file, zinfo, entry, blob_path):
+    """Splice an already-deflated blob into zip_file as a new member.
+
+    This mirrors the bookkeeping in ZipFile.write(), but copies the
+    compressed bytes straight through instead of deflating them again.
+    """
+    zinfo.CRC = entry['crc']
+    zinfo.file_size = entry['file_size']
+    zinfo.compress_size = entry['compress_size']
+    zinfo.flag_bits = 0x00
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+    zip_file.fp.write(zinfo.FileHeader())
+    with open(blob_path, 'rb') as blob:
+        shutil.copyfileobj(blob, zip_file.fp)
+    if hasattr(zip_file, 'start_dir'):
+        zip_file.start_dir = zip_file.fp.tell()
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+
+
+def _compress_job(args):
+    return compress_to_blob(*args)
+
+
+def compress_files(paths, blob_dir, level, jobs=1):
+    """Compress files into blob_dir, using a pool of processes if jobs > 1.
+
+    Entries are returned in the same order as the paths.
+    """
+    job_args = [(path, blob_dir, level) for path in paths]
+    if jobs > 1 and len(paths) > 1:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        return list(run_in_pool(_compress_job, job_args, jobs, chunksize))
+    return [_compress_job(args) for args in job_args]
+
+
+def write_zip(zip_file_path, files, use_cache=True, jobs=1,
+              level=COMPRESSION_LEVELS['default'], reproducible=True):
+    """Write a zip of files, given as (path, arcname) pairs.
+
+    A reproducible zip is byte-for-byte the same whenever it is built from
+    the same files with the same compression level (and zlib version).
+    Its entries are sorted by name, and have normalized timestamps and
+    modes. Otherwise entries are written in the order they are given,
+    with timestamps and modes from the filesystem.
+
+    Returns the entries written, as (arcname, entry) pairs, where each
+    entry describes the compressed file (see zipcache.compress_file).
+    """
+    with span('zip.walk'):
+        files = list(files)
+    if reproducible:
+        files.sort(key=lambda f: get_zip_name(f[1]))
+    entries = {}
+    if use_cache:
+        cache = ZipCache()
+        blob_dir = cache.blob_dir
+        with span('zip.cache_lookup'):
+            for path, arcname in files:
+                entries[path] = cache.lookup(path, level)
+        count('zip.cache_hits', cache.hits)
+        count('zip.cache_misses', cache.misses)
+    else:
+        cache = None
+        blob_dir = tempfile.mkdtemp(prefix='lambkin-zip-')
+
+    try:
+        missing = [path for path, arcname in files if not entries.get(path)]
+        with span('zip.compress', files=len(missing), jobs=jobs):
+            compressed = compress_files(missing, blob_dir, level, jobs)
+        for path, entry in zip(missing, compressed):
+            entries[path] = entry
+            if cache:
+                cache.add(path, entry)
+
+        with span('zip.write', files=len(files)):
+            zip_file = zipfile.ZipFile(zip_file_path, 'w',
+                                       zipfile.ZIP_DEFLATED)
+            for path, arcname in files:
+                entry = entries[path]
+                blob_path = get_blob_path(blob_dir, entry['sha256'], level)
+                zinfo = make_zip_info(path, arcname, reproducible)
+                write_compressed(zip_file, zinfo, entry, blob_path)
+                count('zip.bytes', entry['file_size'])
+                count('zip.compressed_bytes', entry['compress_size'])
+            zip_file.close()
+        count('zip.files', len(files))
+    finally:
+        if not cache:
+            shutil.rmtree(blob_dir)
+
+    if cache:
+        cache.save()
+    return [(arcname, entries[path]) for path, arcname in files]
+
+
+def create_zip(zip_file_path, use_cache=True, jobs=1,
+               level=COMPRESSION_LEVELS['default'], dependencies=True,
+               ignored=None, reproducible=True, bytecode=None):
+    """Build the deployment package for the function in the current dir.
+
+    zip_file_path may also be an open file object, which the zip is
+    written into. Returns whichever was used. Paths left out by the
+    ignore rules are appended to the list "ignored", if one is given.
+    Compiled bytecode is added as the "bytecode" mode (by default, the
+    one in the metadata) asks.
+    """
+    if not zip_file_path:
+        function = metadata.get('function')
+        zip_file_path = '/tmp/lambkin-publish-%s.zip' % function
+
+    files = get_package_files(dependencies=dependencies, ignored=ignored)
+    files = add_bytecode(
+        list(files), bytecode or metadata.get('bytecode'),
+        lambda st: get_date_time(st, reproducible), jobs=jobs)
+    write_zip(zip_file_path, files, use_cache=use_cache, jobs=jobs,
+              level=level, reproducible=reproducible)
     return zip_file_path
+
+
+def create_layer_zip(zip_file_path, use_cache=True, jobs=1,
+                     level=COMPRESSION_LEVELS['default'], ignored=None,
+                     reproducible=True, bytecode=None):
+    """Build a Lambda layer holding the current function's dependencies.
+
+    Returns a fingerprint of the layer's contents, or None if there are
+    no dependencies to put in a layer.
+    """
+    files = [(path, 'python/' + arcname.lstrip('/'))
+             for path, arcname in get_package_files(code=False,
+                                                    ignored=ignored)]
+    if not files:
+        return None
+    files = add_bytecode(
+        files, bytecode or metadata.get('bytecode'),
+        lambda st: get_date_time(st, reproducible), root='/opt', jobs=jobs)
+    entries = write_zip(zip_file_path, files, use_cache=use_cache,
+                        jobs=jobs, level=level, reproducible=reproducible)
+    fingerprint = hashlib.sha256()
+    for arcname, entry in sorted(entries):
+        fingerprint.update('%s %s\n' % (arcname, entry['sha256']))
+    return fingerprint.hexdigest()
+
+
+def get_code_sha256(package):
+    """Return the digest of an open zip file in the format of CodeSha256."""
+    sha256 = hashlib.sha256()
+    package.seek(0)
+    for chunk in iter(lambda: package.read(CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    return b64encode(sha256.digest())
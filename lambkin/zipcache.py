@@ -0,0 +1,160 @@
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from click import ClickException
+from lambkin.cache import get_cache_dir, mark_used, prune
+
+CHUNK_SIZE = 1024 * 1024
+
+COMPRESSION_LEVELS = {
+    'fast': 1,
+    'default': 6,
+    'best': 9,
+}
+
+
+def get_compression_level(compression):
+    """Turn a level name like "fast", or a digit from 0 to 9, into a level."""
+    if compression is None:
+        compression = 'default'
+    if compression in COMPRESSION_LEVELS:
+        return COMPRESSION_LEVELS[compression]
+    if str(compression).isdigit() and 0 <= int(compression) <= 9:
+        return int(compression)
+    raise ClickException(
+        'Compression must be one of %s, or a level from 0 to 9.' %
+        ', '.join(sorted(COMPRESSION_LEVELS)))
+
+
+def compress_file(path, dst, level=COMPRESSION_LEVELS['default']):
+    """Deflate the file at path into the open file dst.
+
+    The output is a raw deflate stream, exactly as zipfile would store it.
+    Returns a dict with the sha256, crc, file_size and compress_size.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    sha256 = hashlib.sha256()
+    crc = 0
+    file_size = 0
+    compress_size = 0
+    with open(path, 'rb') as src:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            compressed = compressor.compress(chunk)
+            compress_size += len(compressed)
+            dst.write(compressed)
+    compressed = compressor.flush()
+    compress_size += len(compressed)
+    dst.write(compressed)
+    return {
+        'sha256': sha256.hexdigest(),
+        'crc': crc & 0xffffffff,
+        'file_size': file_size,
+        'compress_size': compress_size,
+    }
+
+
+def get_blob_path(blob_dir, sha256, level):
+    return os.path.join(blob_dir, '%s-%d' % (sha256, level))
+
+
+def compress_to_blob(path, blob_dir, level):
+    """Compress a file into blob_dir, named for its content and level.
+
+    Returns the entry describing the blob, including the source mtime.
+    """
+    mtime = os.stat(path).st_mtime
+    fd, tmp_path = tempfile.mkstemp(dir=blob_dir)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            entry = compress_file(path, tmp, level)
+        os.rename(tmp_path, get_blob_path(blob_dir, entry['sha256'], level))
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    entry['mtime'] = mtime
+    return entry
+
+
+class ZipCache(object):
+    """Compressed zip entries from earlier builds, addressed by content.
+
+    Compressed blobs are stored once per (sha256, level) and shared by all
+    functions. Each source directory also gets an index that maps paths to
+    the size, mtime, hash and CRC that were seen last time, so unchanged
+    files can be found without being read at all.
+
+    The compressed size depends on the level, so it isn't kept in the
+    index. It is taken from the blob for the level being used, which is
+    exactly what gets written into the zip.
+    """
+
+    def __init__(self, source_dir='.'):
+        self.blob_dir = get_cache_dir('zip', 'blobs')
+        index_name = hashlib.sha1(os.path.abspath(source_dir)).hexdigest()
+        self.index_path = os.path.join(
+            get_cache_dir('zip', 'index'), '%s.json' % index_name)
+        self.index = self._read_index()
+        self.seen = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def lookup(self, path, level):
+        """Return the cached entry for an unchanged file, or None."""
+        st = os.stat(path)
+        entry = self.index.get(path)
+        if entry and entry['file_size'] == st.st_size and \
+           entry['mtime'] == st.st_mtime:
+            try:
+                blob_st = os.stat(
+                    get_blob_path(self.blob_dir, entry['sha256'], level))
+            except OSError:
+                blob_st = None
+            if blob_st:
+                mark_used(get_blob_path(self.blob_dir, entry['sha256'], level),
+                          blob_st)
+                self.hits += 1
+                entry = dict(entry, compress_size=blob_st.st_size)
+                self.seen[path] = entry
+                return entry
+        self.misses += 1
+        return None
+
+    def add(self, path, entry):
+        """Remember a freshly compressed entry for the next build."""
+        self.seen[path] = entry
+
+    def save(self):
+        """Update the index with the entries used by this build.
+
+        Entries for files that this build didn't use are kept (they may
+        belong to a different zip built from the same directory) unless
+        the files have gone. Blobs and indexes that no build has used for
+        a long while are deleted (see lambkin.cache.prune).
+        """
+        index = dict((path, entry) for path, entry in self.index.iteritems()
+                     if path not in self.seen and os.path.exists(path))
+        for path, entry in self.seen.iteritems():
+            index[path] = dict((key, value) for key, value in entry.items()
+                               if key != 'compress_size')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp_path, self.index_path)
+        prune('zip')
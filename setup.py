@@ -36,6 +36,7 @@ setup(
     install_requires=[
         'boto3',
         'click>=6,<7',
+        'futures',
         'pystache'
     ]
 
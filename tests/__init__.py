@@ -0,0 +1,27 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Runs each test in a fresh temporary dir, with a cache of its own.
+
+    The dir is self.work_dir, and the cache is in its "cache" subdir.
+    """
+
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.old_cache = os.environ.get('LAMBKIN_CACHE_DIR')
+        self.work_dir = tempfile.mkdtemp()
+        os.environ['LAMBKIN_CACHE_DIR'] = os.path.join(self.work_dir,
+                                                       'cache')
+        os.chdir(self.work_dir)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        if self.old_cache is None:
+            del os.environ['LAMBKIN_CACHE_DIR']
+        else:
+            os.environ['LAMBKIN_CACHE_DIR'] = self.old_cache
+        shutil.rmtree(self.work_dir)
@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+from lambkin.bytecode import add_bytecode
+from lambkin.zip import REPRODUCIBLE_DATE_TIME
+from tests import TempDirTestCase
+
+
+class AddBytecodeTest(TempDirTestCase):
+    def setUp(self):
+        super(AddBytecodeTest, self).setUp()
+        os.makedirs(os.path.join('venv', 'bin'))
+        os.symlink(sys.executable, os.path.join('venv', 'bin', 'python'))
+        self.site_dir = os.path.join('.', 'venv', 'lib', 'python2.7',
+                                     'site-packages')
+        os.makedirs(self.site_dir)
+
+    def write_source(self, name, source):
+        path = os.path.join(self.site_dir, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        return path, '/' + name
+
+    def add_bytecode(self, files):
+        return add_bytecode(files, 'dependencies',
+                            lambda st: REPRODUCIBLE_DATE_TIME)
+
+    def test_compiles_dependencies(self):
+        files = [self.write_source('good.py', 'x = 1\n')]
+        arcnames = [arcname for path, arcname in self.add_bytecode(files)]
+        self.assertIn('/good.pyc', arcnames)
+
+    def test_skips_sources_that_do_not_compile(self):
+        # Code for a newer Python than the virtualenv's is common in
+        # packages that support several versions.
+        files = [self.write_source('good.py', 'x = 1\n'),
+                 self.write_source('bad.py', 'async def f():\n    pass\n')]
+        arcnames = [arcname for path, arcname in self.add_bytecode(files)]
+        self.assertIn('/good.pyc', arcnames)
+        self.assertIn('/bad.py', arcnames)
+        self.assertNotIn('/bad.pyc', arcnames)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import time
+import unittest
+from lambkin.cache import MAX_AGE, PRUNE_INTERVAL, PRUNE_STAMP
+from lambkin.cache import get_cache_dir, prune
+from tests import TempDirTestCase
+
+
+class PruneTest(TempDirTestCase):
+    def make_file(self, name, age):
+        path = os.path.join(get_cache_dir('zip', 'blobs'), name)
+        with open(path, 'w') as f:
+            f.write(name)
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    def test_only_stale_files_are_deleted(self):
+        stale = self.make_file('stale', MAX_AGE + 60)
+        fresh = self.make_file('fresh', MAX_AGE - 60)
+        self.assertEqual(prune('zip'), 1)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_pruned_at_most_once_per_interval(self):
+        prune('zip')
+        stale = self.make_file('stale', MAX_AGE + 60)
+        self.assertEqual(prune('zip'), 0)
+        self.assertTrue(os.path.exists(stale))
+        stamp = os.path.join(get_cache_dir('zip'), PRUNE_STAMP)
+        then = time.time() - PRUNE_INTERVAL - 60
+        os.utime(stamp, (then, then))
+        self.assertEqual(prune('zip'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
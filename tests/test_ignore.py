@@ -0,0 +1,61 @@
+import unittest
+from lambkin.ignore import IgnoreRules
+
+
+class IgnoreRulesTest(unittest.TestCase):
+    def test_unanchored_pattern_matches_at_any_depth(self):
+        rules = IgnoreRules(['*.pyc'])
+        self.assertTrue(rules.ignores('a.pyc'))
+        self.assertTrue(rules.ignores('pkg/sub/a.pyc'))
+        self.assertFalse(rules.ignores('a.py'))
+
+    def test_anchored_pattern_matches_from_the_root(self):
+        rules = IgnoreRules(['/build', 'docs/api'])
+        self.assertTrue(rules.ignores('build'))
+        self.assertFalse(rules.ignores('pkg/build'))
+        self.assertTrue(rules.ignores('docs/api'))
+        self.assertFalse(rules.ignores('pkg/docs/api'))
+
+    def test_star_does_not_cross_directories(self):
+        rules = IgnoreRules(['pkg/*.txt'])
+        self.assertTrue(rules.ignores('pkg/a.txt'))
+        self.assertFalse(rules.ignores('pkg/sub/a.txt'))
+
+    def test_double_star(self):
+        rules = IgnoreRules(['pkg/**/data', 'logs/**'])
+        self.assertTrue(rules.ignores('pkg/data'))
+        self.assertTrue(rules.ignores('pkg/a/b/data'))
+        self.assertFalse(rules.ignores('other/data'))
+        self.assertTrue(rules.ignores('logs/a/b.log'))
+
+    def test_dir_only_pattern(self):
+        rules = IgnoreRules(['tests/'])
+        self.assertTrue(rules.ignores('pkg/tests', is_dir=True))
+        self.assertFalse(rules.ignores('pkg/tests'))
+
+    def test_last_matching_pattern_wins(self):
+        rules = IgnoreRules(['*.txt', '!keep.txt'])
+        self.assertTrue(rules.ignores('a.txt'))
+        self.assertFalse(rules.ignores('keep.txt'))
+        rules = IgnoreRules(['!keep.txt', '*.txt'])
+        self.assertTrue(rules.ignores('keep.txt'))
+
+    def test_character_classes(self):
+        rules = IgnoreRules(['*.py[co]'])
+        self.assertTrue(rules.ignores('a.pyc'))
+        self.assertTrue(rules.ignores('a.pyo'))
+        self.assertFalse(rules.ignores('a.pyx'))
+
+    def test_negated_character_classes(self):
+        rules = IgnoreRules(['*.[!p]y'])
+        self.assertFalse(rules.ignores('a.py'))
+        self.assertTrue(rules.ignores('a.ry'))
+        self.assertFalse(rules.ignores('a/y'))
+
+    def test_comments_and_blank_lines(self):
+        rules = IgnoreRules(['# *.py', '', '  '])
+        self.assertFalse(rules.ignores('a.py'))
+
+
+if __name__ == '__main__':
+    unittest.main()
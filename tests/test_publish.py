@@ -0,0 +1,94 @@
+import json
+import os
+import unittest
+from moto import mock_iam
+from tempfile import SpooledTemporaryFile
+from lambkin.aws import get_client
+from lambkin.publish import publish_package
+from lambkin.zip import get_code_sha256
+from tests import TempDirTestCase
+
+ARN = 'arn:aws:lambda:us-east-1:123456789012'
+DEPENDENCY_LAYER = ARN + ':layer:hello-dependencies:3'
+OTHER_LAYER = ARN + ':layer:shared-tools:1'
+TRUST_POLICY = {'Statement': [{
+    'Effect': 'Allow',
+    'Principal': {'Service': 'lambda.amazonaws.com'},
+    'Action': 'sts:AssumeRole',
+}]}
+
+
+class FakeLambda(object):
+    """Just enough of a Lambda client to update an existing function."""
+
+    def __init__(self, configuration):
+        self.configuration = configuration
+        self.updates = []
+
+    def get_function_configuration(self, FunctionName):
+        return self.configuration
+
+    def update_function_configuration(self, FunctionName, **changes):
+        self.updates.append(changes)
+        return dict(self.configuration, **changes)
+
+
+class PublishLayersTest(TempDirTestCase):
+    def setUp(self):
+        super(PublishLayersTest, self).setUp()
+        self.old_environ = dict(os.environ)
+        os.environ.update(AWS_ACCESS_KEY_ID='testing',
+                          AWS_SECRET_ACCESS_KEY='testing',
+                          AWS_DEFAULT_REGION='us-east-1')
+        self.mock = mock_iam()
+        self.mock.start()
+        self.role_arn = get_client('iam').create_role(
+            RoleName='lambkin-test-publish',
+            AssumeRolePolicyDocument=json.dumps(TRUST_POLICY))['Role']['Arn']
+
+    def tearDown(self):
+        self.mock.stop()
+        os.environ.clear()
+        os.environ.update(self.old_environ)
+        super(PublishLayersTest, self).tearDown()
+
+    def publish(self, live_layers, **kwargs):
+        package = SpooledTemporaryFile()
+        package.write(b'not really a zip')
+        configuration = {
+            'FunctionName': 'hello',
+            'CodeSha256': get_code_sha256(package),
+            'Description': 'Says hello',
+            'Role': self.role_arn,
+            'Timeout': 3,
+            'MemorySize': 128,
+        }
+        if live_layers is not None:
+            configuration['Layers'] = [{'Arn': arn} for arn in live_layers]
+        lmbda = FakeLambda(configuration)
+        action, _ = publish_package(
+            package, 'hello', 'python2.7', 'Says hello',
+            'lambkin-test-publish', 3, 128, lmbda=lmbda, **kwargs)
+        return action, lmbda.updates
+
+    def test_layers_left_alone(self):
+        self.assertEqual(self.publish([DEPENDENCY_LAYER]),
+                         ('unchanged', []))
+
+    def test_dropped_layer_is_taken_off(self):
+        self.assertEqual(
+            self.publish([OTHER_LAYER, DEPENDENCY_LAYER],
+                         dropped_layer='hello-dependencies'),
+            ('updated', [{'Layers': [OTHER_LAYER]}]))
+
+    def test_dropped_layer_already_gone(self):
+        self.assertEqual(
+            self.publish(None, dropped_layer='hello-dependencies'),
+            ('unchanged', []))
+
+    def test_no_layers_is_no_change(self):
+        self.assertEqual(self.publish(None, layers=[]), ('unchanged', []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from lambkin.report import parse_report
+
+
+class ParseReportTest(unittest.TestCase):
+    def test_report_line(self):
+        log = ('START RequestId: 1f2e Version: $LATEST\n'
+               'REPORT RequestId: 1f2e\tDuration: 2.50 ms\t'
+               'Billed Duration: 100 ms\tMemory Size: 128 MB\t'
+               'Max Memory Used: 20 MB\tInit Duration: 110.12 ms\t\n')
+        self.assertEqual(parse_report(log), {
+            'duration_ms': 2.5,
+            'billed_duration_ms': 100.0,
+            'memory_size_mb': 128.0,
+            'max_memory_used_mb': 20.0,
+            'init_duration_ms': 110.12,
+        })
+
+    def test_init_report_line(self):
+        log = 'INIT_REPORT Init Duration: 250.41 ms\tPhase: init\tStatus: error\n'
+        self.assertEqual(parse_report(log), {'init_duration_ms': 250.41})
+
+    def test_no_report(self):
+        self.assertIsNone(parse_report('START RequestId: 1f2e\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
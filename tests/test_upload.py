@@ -0,0 +1,45 @@
+import os
+import unittest
+from moto import mock_s3
+from tempfile import SpooledTemporaryFile
+from lambkin.aws import get_client
+from lambkin.upload import MULTIPART_CHUNK_SIZE, stage_in_s3
+
+
+class StageInS3Test(unittest.TestCase):
+    def setUp(self):
+        self.old_environ = dict(os.environ)
+        os.environ.update(AWS_ACCESS_KEY_ID='testing',
+                          AWS_SECRET_ACCESS_KEY='testing',
+                          AWS_DEFAULT_REGION='us-east-1')
+        self.mock = mock_s3()
+        self.mock.start()
+        self.s3 = get_client('s3')
+        self.s3.create_bucket(Bucket='lambkin-test')
+
+    def tearDown(self):
+        self.mock.stop()
+        os.environ.clear()
+        os.environ.update(self.old_environ)
+
+    def stage(self, size):
+        package = SpooledTemporaryFile()
+        package.write(b'x' * size)
+        location = stage_in_s3(package, 'lambkin-test', 'package.zip')
+        self.assertEqual(location, {'S3Bucket': 'lambkin-test',
+                                    'S3Key': 'package.zip'})
+        staged = self.s3.get_object(Bucket='lambkin-test', Key='package.zip')
+        self.assertEqual(staged['ContentLength'], size)
+        # The package is still needed after it has been staged.
+        package.seek(0)
+        self.assertEqual(len(package.read()), size)
+
+    def test_small_package(self):
+        self.stage(1024)
+
+    def test_multipart_package(self):
+        self.stage(MULTIPART_CHUNK_SIZE + 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import random
+import unittest
+from lambkin.zip import write_zip
+from tests import TempDirTestCase
+
+
+class ZipCacheLevelTest(TempDirTestCase):
+    def setUp(self):
+        super(ZipCacheLevelTest, self).setUp()
+        # Text that compresses to a different size at each level.
+        rng = random.Random(0)
+        words = ['lambda', 'layer', 'zip', 'cache', 'level', 'blob']
+        with open('handler.py', 'w') as f:
+            for _ in range(20000):
+                f.write(rng.choice(words) + rng.choice(' \n'))
+        self.files = [('handler.py', 'handler.py')]
+
+    def build(self, level, use_cache=True):
+        path = 'package-%d-%s.zip' % (level, use_cache)
+        write_zip(path, self.files, use_cache=use_cache, level=level)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_cache_history_does_not_change_the_zip(self):
+        uncached = self.build(6, use_cache=False)
+        self.assertEqual(self.build(6), uncached)
+        self.build(1)
+        self.assertEqual(self.build(6), uncached)
+
+
+if __name__ == '__main__':
+    unittest.main()